@@ -0,0 +1,246 @@
+"""Throughput and latency benchmarks for Sha256bit.
+
+Run all the benchmarks and save the results:
+
+    python3 -m bench.bench --save bench.json
+
+Compare a later run with saved results, exit status is 1 if a case is
+slower than the saved one by more than the threshold:
+
+    python3 -m bench.bench --compare bench.json --threshold 0.1
+
+Each case is timed with timeit.Timer.autorange, the best of repeat runs is
+kept. hashlib.sha256 on the same bytes is timed as reference.
+"""
+
+import argparse
+import hashlib
+import json
+import platform
+import sys
+import time
+import timeit
+
+from sha256bit import Sha256bit, backend
+
+KIB = 1 << 10
+MIB = 1 << 20
+SIZES = [0, 55, 64, KIB, 64 * KIB, MIB, 100 * MIB]
+CHUNK_SIZES = [1, 63, 64, 1000, 4 * KIB, 64 * KIB]
+CHUNKED_SIZE = MIB
+TRACE_MAX_SIZE = 64 * KIB
+FORMAT_VERSION = 1
+
+
+def _blocks(bitlen):
+    """Number of blocks compressed for a message of bitlen bits"""
+
+    return (bitlen + 64 + 512) // 512
+
+
+def _size_name(size):
+    if size >= MIB and 0 == size % MIB:
+        return '%dMiB' % (size // MIB)
+    if size >= KIB and 0 == size % KIB:
+        return '%dKiB' % (size // KIB)
+    return '%dB' % size
+
+
+def _measure(fn, repeat):
+    """Return the best time of one call of fn, in seconds"""
+
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    times = [elapsed]
+    if elapsed < 1.0 and repeat > 1:
+        times += timer.repeat(repeat - 1, number)
+    return min(times) / number
+
+
+def _oneshot(data, bitlen, backend_name, tracer=None):
+    def fn():
+        Sha256bit(data, bitlen=bitlen, tracer=tracer, backend=backend_name).digest()
+
+    return fn
+
+
+def _chunked(data, chunk_size, backend_name, chunk_bitlen=None):
+    chunks = [memoryview(data)[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    def fn():
+        h = Sha256bit(backend=backend_name)
+        for chunk in chunks:
+            h.update(chunk, bitlen=chunk_bitlen and min(chunk_bitlen, len(chunk) * 8))
+        h.digest()
+
+    return fn
+
+
+def _state_round_trip(data, to_bytes):
+    h = Sha256bit(data)
+
+    def fn():
+        if to_bytes:
+            Sha256bit.import_state_bytes(h.export_state_bytes())
+        else:
+            Sha256bit.import_state(h.export_state())
+
+    return fn
+
+
+def _reference(data):
+    def fn():
+        hashlib.sha256(data).digest()
+
+    return fn
+
+
+def cases(*, backends, max_size):
+    """Yield (name, size, bitlen, fn) for each benchmark case"""
+
+    sizes = [size for size in SIZES if size <= max_size]
+    for size in sizes:
+        data = bytes(size)
+        yield 'hashlib/%s' % _size_name(size), size, size * 8, _reference(data)
+    for name in backends:
+        for size in sizes:
+            data = bytes(size)
+            yield 'oneshot/%s/%s' % (name, _size_name(size)), size, size * 8, _oneshot(data, None, name)
+            if size:
+                bitlen = size * 8 - 3
+                yield 'odd_bitlen/%s/%s' % (name, _size_name(size)), size, bitlen, _oneshot(data, bitlen, name)
+        size = min(CHUNKED_SIZE, max_size)
+        data = bytes(size)
+        for chunk_size in CHUNK_SIZES:
+            if chunk_size > size:
+                continue
+            case = 'chunked/%s/%s/%s' % (name, _size_name(size), _size_name(chunk_size))
+            yield case, size, size * 8, _chunked(data, chunk_size, name)
+            # each chunk but the last one misses a bit: every update is unaligned
+            if chunk_size >= KIB:
+                bitlen = size * 8 - (size // chunk_size)
+                case = 'chunked_odd_bitlen/%s/%s/%s' % (name, _size_name(size), _size_name(chunk_size))
+                yield case, size, bitlen, _chunked(data, chunk_size, name, chunk_size * 8 - 1)
+    for size in sizes:
+        if size > TRACE_MAX_SIZE:
+            continue
+        data = bytes(size)
+        yield 'trace_off/python/%s' % _size_name(size), size, size * 8, _oneshot(data, None, 'python')
+        tracer = lambda event, fields: None  # noqa: E731
+        yield 'trace_on/python/%s' % _size_name(size), size, size * 8, _oneshot(data, None, 'python', tracer)
+    for size in [0, 63, 64 * KIB]:
+        data = bytes(size)
+        yield 'state_round_trip/%s' % _size_name(size), 0, 0, _state_round_trip(data, False)
+        yield 'state_bytes_round_trip/%s' % _size_name(size), 0, 0, _state_round_trip(data, True)
+
+
+def run(*, backends, max_size, repeat, select=None, out=sys.stdout):
+    """Run the benchmark cases whose name contains select, return the results by case name
+
+    seconds is the time of one call, mb_s and ns_block are None for the
+    cases which do not hash a message, vs_hashlib is the time relative to
+    hashlib.sha256 on a message of the same size.
+    """
+
+    results = {}
+    reference = {}
+    print('%-44s %12s %10s %10s %10s' % ('case', 'us/op', 'MB/s', 'ns/block', 'x hashlib'), file=out)
+    for name, size, bitlen, fn in cases(backends=backends, max_size=max_size):
+        # the hashlib references are always run
+        if select is not None and select not in name and not name.startswith('hashlib/'):
+            continue
+        seconds = _measure(fn, repeat)
+        result = {'seconds': seconds, 'size': size, 'bitlen': bitlen}
+        result['mb_s'] = size / seconds / 1e6 if size else None
+        result['ns_block'] = seconds * 1e9 / _blocks(bitlen) if bitlen or size else None
+        if name.startswith('hashlib/'):
+            reference[size] = seconds
+        ref = reference.get(size) if size else None
+        result['vs_hashlib'] = seconds / ref if ref else None
+        results[name] = result
+        print(
+            '%-44s %12.3f %10s %10s %10s'
+            % (
+                name,
+                seconds * 1e6,
+                _fmt(result['mb_s'], '%.1f'),
+                _fmt(result['ns_block'], '%.0f'),
+                _fmt(result['vs_hashlib'], '%.1f'),
+            ),
+            file=out,
+            flush=True,
+        )
+    return results
+
+
+def _fmt(value, fmt):
+    return '-' if value is None else fmt % value
+
+
+def compare(results, baseline, threshold, out=sys.stdout):
+    """Print the cases slower than baseline by more than threshold (0.1 is 10%), return their names
+
+    The hashlib references are not compared, they only show how much the
+    host speed differs between the runs.
+    """
+
+    slower = []
+    for name, result in results.items():
+        if name not in baseline or name.startswith('hashlib/'):
+            continue
+        ratio = result['seconds'] / baseline[name]['seconds']
+        if ratio > 1 + threshold:
+            slower.append(name)
+            print('SLOWER  %-44s %6.2fx' % (name, ratio), file=out)
+        elif ratio < 1 / (1 + threshold):
+            print('faster  %-44s %6.2fx' % (name, ratio), file=out)
+    if not slower:
+        print('no case slower by more than %d%%' % (threshold * 100), file=out)
+    return slower
+
+
+def save(path, results):
+    data = {
+        'version': FORMAT_VERSION,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != FORMAT_VERSION:
+        raise AssertionError('%s: unsupported format version %s' % (path, data.get('version')))
+    return data['results']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='sha256bit benchmarks')
+    parser.add_argument('--backend', action='append', help='backend to benchmark, default all available')
+    parser.add_argument('--max-size', type=int, default=max(SIZES), help='largest message size in bytes')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timings of each case, the best is kept')
+    parser.add_argument('--quick', action='store_true', help='messages up to 64KiB, one timing per case')
+    parser.add_argument('-k', dest='select', help='only run cases whose name contains this string')
+    parser.add_argument('--save', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='compare with results saved in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as regression')
+    args = parser.parse_args()
+    if args.quick:
+        args.max_size = min(args.max_size, 64 * KIB)
+        args.repeat = 1
+    baseline = load(args.compare) if args.compare else None
+    results = run(
+        backends=args.backend or backend.available_backends(),
+        max_size=args.max_size,
+        repeat=args.repeat,
+        select=args.select,
+    )
+    if args.save:
+        save(args.save, results)
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
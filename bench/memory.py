@@ -0,0 +1,68 @@
+"""Memory footprint and allocation churn of Sha256bit instances.
+
+    python3 -m bench.memory  # Python 3.9+
+
+Reports, measured with tracemalloc:
+
+- the bytes held by one fresh instance and by one instance after hashing
+  (the state words are new int objects then, unless stored in an array)
+- the peak of the memory allocated while hashing one short message, with
+  a new instance and with a pooled one
+"""
+
+import argparse
+import sys
+import tracemalloc
+
+from sha256bit import Sha256bit
+from sha256bit.pool import HasherPool
+
+
+def per_instance(n, message):
+    """Return the bytes held by each of n instances which absorbed message"""
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        hashers = [Sha256bit(message) for _ in range(n)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del hashers
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')) / n
+
+
+def peak(fn, repeat=100):
+    """Return the lowest peak of the memory allocated during a call of fn, in bytes"""
+
+    fn()
+    best = None
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            _, top = tracemalloc.get_traced_memory()
+            best = top - current if best is None else min(best, top - current)
+    finally:
+        tracemalloc.stop()
+    return best
+
+
+def report(n, out=sys.stdout):
+    """Write the measures with n instances to out"""
+
+    message = bytes(100)
+    pool = HasherPool()
+    print('bytes per fresh instance:          %8.1f' % per_instance(n, None), file=out)
+    print('bytes per instance after hashing:  %8.1f' % per_instance(n, message), file=out)
+    print('peak bytes per digest, new hasher: %8d' % peak(lambda: Sha256bit(message).digest()), file=out)
+    print('peak bytes per digest, pooled:     %8d' % peak(lambda: pool.digest(message)), file=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='sha256bit memory use')
+    parser.add_argument('-n', type=int, default=10000, help='number of instances')
+    args = parser.parse_args()
+    report(args.n)
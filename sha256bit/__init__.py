@@ -1,12 +1,14 @@
 import binascii
-import logging
+import mmap
+import operator
+import os
 import struct
-import sys
+from array import array
 
-try:
-    from pysatl import Utils
-except ImportError:
-    pass  # we just don't support logging
+from sha256bit import backend, perf, trace
+from sha256bit.trace import LoggingTracer, get_tracer, set_tracer
+
+__all__ = ['LoggingTracer', 'Sha256bit', 'get_tracer', 'set_tracer']
 
 
 class Sha256bit:
@@ -102,76 +104,177 @@ class Sha256bit:
     def _ch(x, y, z):
         return (x & y) ^ ((~x) & z)
 
+    __slots__ = ('_cache', '_cache_len', '_compress', '_counter', '_digest', '_h', '_tracer')
+
     _output_size = 8
     blocksize = 1
     block_size = 64
     digest_size = 32
 
-    def __init__(self, m=None, *, bitlen=None):
+    def __init__(self, m=None, *, bitlen=None, tracer=None, backend=None):
         """SHA-256 implementation supporting bit granularity for message input length.
         API is the same as hashlib.
+
+        tracer receives all intermediate values, see sha256bit.trace.
+        If None, the tracer set by set_tracer is used.
+        backend selects the block compression engine, see sha256bit.backend.
+        It is ignored when tracing.
+        The work of all instances is counted while sha256bit.perf counters are enabled.
         """
 
-        self._verbose = 'pysatl' in sys.modules
+        self._tracer = trace.get_tracer() if tracer is None else tracer
         self._counter = 0
-        self._cache = bytearray()
-        self._h = list(Sha256bit.H_INIT)
-        self._has_bitlen = False
+        self._cache = bytearray(64)
+        self._cache_len = 0
+        self._h = array(_WORD, _H_INIT)
         self._digest = None
+        if self._tracer is None:
+            self._compress = _engines.get(backend) or _get_engine(backend)
+        else:
+            self._compress = self._compress_traced
+
+        if m is not None:
+            self.update(m, bitlen=bitlen)
+
+    def __getstate__(self):
+        # pickle support for all protocols, the compression engines pickle as references to their backend
+        return {name: getattr(self, name) for name in Sha256bit.__slots__}
 
-        self.update(m, bitlen=bitlen)
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def export_state(self):
         """Export current state to a dict"""
 
+        if perf._enabled:
+            perf._count('exports')
+
         if self._digest is None:
-            h = self._h
-            c = self._cache
-            if self._verbose:
-                logging.info('exporting current state:')
-                logging.info('  bitlen = %d' % self._counter)
-                logging.info('  state:  ' + Utils.hexstr(self._state_bytes()))
-                logging.info('  cache:  ' + Utils.hexstr(c))
+            h = list(self._h)
+            c = self._cache[: self._cache_len]
+            if self._tracer is not None:
+                self._tracer('export', {'bitlen': self._counter, 'state': tuple(h), 'cache': bytes(c)})
         else:
             h = self._digest
             c = None
-            if self._verbose:
-                logging.info('exporting finalized digest:')
-                logging.info('  digest:  ' + Utils.hexstr(h))
+            if self._tracer is not None:
+                self._tracer('export_digest', {'digest': h})
         return {'h': h, 'cnt': self._counter, 'cache': c}
 
     @staticmethod
-    def import_state(state):
+    def import_state(state, *, tracer=None, backend=None):
         """Initialize an instance from an exported state"""
 
-        o = Sha256bit()
+        o = Sha256bit(tracer=tracer, backend=backend)
+        if perf._enabled:
+            perf._count('imports')
         o._counter = state['cnt']
-        if 0 != (o._counter % 8):
-            o._has_bitlen = True
         if state['cache'] is None:
             o._digest = state['h']
             o._h = None
             o._cache = None
-            if o._verbose:
-                logging.info('importing finalized digest:')
-                logging.info('  digest:  ' + Utils.hexstr(o._digest))
+            if o._tracer is not None:
+                o._tracer('import_digest', {'digest': o._digest})
         else:
-            o._h = state['h']
-            o._cache = bytearray(state['cache'])
-            if o._verbose:
-                logging.info('importing current state:')
-                logging.info('  bitlen = %d' % o._counter)
-                logging.info('  state:  ' + Utils.hexstr(o._state_bytes()))
-                logging.info('  cache:  ' + Utils.hexstr(o._cache))
+            o._h = array(_WORD, state['h'])
+            o._cache_len = len(state['cache'])
+            o._cache[: o._cache_len] = state['cache']
+            if o._tracer is not None:
+                cache = bytes(o._cache[: o._cache_len])
+                o._tracer('import', {'bitlen': o._counter, 'state': tuple(o._h), 'cache': cache})
+        return o
+
+    def export_state_bytes(self):
+        """Export current state to bytes.
+
+        Layout (big endian): version (1 byte, currently 1), state (8 words),
+        bit counter (8 bytes), length of the partial block (1 byte),
+        partial block. For a finalized digest, the state is the digest and
+        the length is 0xFF with no partial block.
+        """
+
+        if perf._enabled:
+            perf._count('exports')
+
+        if self._digest is None:
+            c = self._cache[: self._cache_len]
+            if self._tracer is not None:
+                self._tracer('export', {'bitlen': self._counter, 'state': tuple(self._h), 'cache': bytes(c)})
+            return _STATE_HEADER.pack(_STATE_VERSION, *self._h, self._counter, len(c)) + c
+        if self._tracer is not None:
+            self._tracer('export_digest', {'digest': self._digest})
+        return _STATE_HEADER.pack(_STATE_VERSION, *struct.unpack('!8L', self._digest), self._counter, _FINALIZED)
+
+    @staticmethod
+    def import_state_bytes(data, *, tracer=None, backend=None):
+        """Initialize an instance from the output of export_state_bytes.
+        Trailing bytes after the partial block are ignored.
+        """
+
+        data = memoryview(data).cast('B')
+        if len(data) < _STATE_HEADER.size:
+            raise AssertionError('truncated state')
+        version, *h, counter, cache_len = _STATE_HEADER.unpack(data[: _STATE_HEADER.size])
+        if version != _STATE_VERSION:
+            raise AssertionError('unsupported state version %d' % version)
+        if cache_len == _FINALIZED:
+            state = {'h': struct.pack('!8L', *h), 'cnt': counter, 'cache': None}
+            return Sha256bit.import_state(state, tracer=tracer, backend=backend)
+        if cache_len != ((counter % 512) + 7) // 8:
+            raise AssertionError('bitlen=%d, cache length=%d' % (counter, cache_len))
+        cache = data[_STATE_HEADER.size : _STATE_HEADER.size + cache_len]
+        if len(cache) != cache_len:
+            raise AssertionError('truncated state')
+        return Sha256bit.import_state({'h': h, 'cnt': counter, 'cache': cache}, tracer=tracer, backend=backend)
+
+    @staticmethod
+    def from_file(file, *, bitlen=None, tracer=None, backend=None, buffer_size=1 << 16, use_mmap=False):
+        """Initialize an instance from the content of a file, see update_from_file"""
+
+        o = Sha256bit(tracer=tracer, backend=backend)
+        o.update_from_file(file, bitlen=bitlen, buffer_size=buffer_size, use_mmap=use_mmap)
         return o
 
-    def _state_bytes(self):
-        return b''.join([struct.pack('!L', i) for i in self._h[: self._output_size]])
+    @staticmethod
+    def with_prefix(prefix, *, cache=None, tracer=None, backend=None):
+        """Initialize an instance with prefix already absorbed.
+        The state after the block aligned part of prefix comes from cache,
+        a sha256bit.midstate.MidstateCache, by default midstate.default_cache.
+        On a cache miss, the state is computed with backend.
+        """
+
+        from sha256bit import midstate
+
+        if cache is None:
+            cache = midstate.default_cache
+        state, aligned_length = cache.get(prefix, backend=backend)
+        o = Sha256bit(tracer=tracer, backend=backend)
+        o._h = array(_WORD, state)
+        o._counter = aligned_length * 8
+        o.update(memoryview(prefix).cast('B')[aligned_length:])
+        return o
+
+    @staticmethod
+    def hash_many(messages, bitlens=None):
+        """Return the list of the digests of messages, bitlens optionally gives their bit lengths.
+        Messages are hashed in parallel lanes using NumPy if available, see sha256bit.batch.
+        """
+
+        from sha256bit.batch import hash_many
+
+        return hash_many(messages, bitlens)
+
+    def _compress_traced(self, h, blocks):
+        """Reference compression engine, reports every intermediate value to the tracer"""
 
-    def _compress(self, block):
-        if self._verbose:
-            logging.info('state:  ' + Utils.hexstr(self._state_bytes()))
-            logging.info('block:  ' + Utils.hexstr(block))
+        blocks = memoryview(blocks).cast('B')
+        for offset in range(0, len(blocks), 64):
+            self._compress_block_traced(h, blocks[offset : offset + 64])
+
+    def _compress_block_traced(self, h, block):
+        tracer = self._tracer
+        tracer('block', {'state': tuple(h), 'block': bytes(block)})
 
         w = [0] * 64
         w[0:16] = struct.unpack('!16L', block)
@@ -181,26 +284,15 @@ class Sha256bit:
             s1 = Sha256bit._rotr(w[i - 2], 17) ^ Sha256bit._rotr(w[i - 2], 19) ^ (w[i - 2] >> 10)
             w[i] = (w[i - 16] + s0 + w[i - 7] + s1) & Sha256bit.F32
 
-        a, b, c, d, e, f, g, h = self._h
-
-        if self._verbose:
-            logging.debug('current state:')
-            logging.debug('  a = 0x%08x' % (a))
-            logging.debug('  b = 0x%08x' % (b))
-            logging.debug('  c = 0x%08x' % (c))
-            logging.debug('  d = 0x%08x' % (d))
-            logging.debug('  e = 0x%08x' % (e))
-            logging.debug('  f = 0x%08x' % (f))
-            logging.debug('  g = 0x%08x' % (g))
-            logging.debug('  h = 0x%08x' % (h))
+        a, b, c, d, e, f, g, hh = h
 
         for i in range(64):
             s0 = Sha256bit._rotr(a, 2) ^ Sha256bit._rotr(a, 13) ^ Sha256bit._rotr(a, 22)
             t2 = (s0 + Sha256bit._maj(a, b, c)) & Sha256bit.F32
             s1 = Sha256bit._rotr(e, 6) ^ Sha256bit._rotr(e, 11) ^ Sha256bit._rotr(e, 25)
-            t1 = (h + s1 + Sha256bit._ch(e, f, g) + Sha256bit.K[i] + w[i]) & Sha256bit.F32
+            t1 = (hh + s1 + Sha256bit._ch(e, f, g) + Sha256bit.K[i] + w[i]) & Sha256bit.F32
 
-            h = g
+            hh = g
             g = f
             f = e
             e = (d + t1) & Sha256bit.F32
@@ -209,124 +301,502 @@ class Sha256bit:
             b = a
             a = (t1 + t2) & Sha256bit.F32
 
-            if self._verbose:
-                logging.debug('state after round %d' % (i + 1))
-                logging.debug('  k[%02d] = 0x%08x' % (i, Sha256bit.K[i]))
-                logging.debug('  w[%02d] = 0x%08x' % (i, w[i]))
-                logging.debug('  s0    = 0x%08x' % (s0))
-                logging.debug('  s1    = 0x%08x' % (s1))
-                logging.debug('  t1    = 0x%08x' % (t1))
-                logging.debug('  t2    = 0x%08x' % (t2))
-                logging.debug('  a     = 0x%08x' % (a))
-                logging.debug('  b     = 0x%08x' % (b))
-                logging.debug('  c     = 0x%08x' % (c))
-                logging.debug('  d     = 0x%08x' % (d))
-                logging.debug('  e     = 0x%08x' % (e))
-                logging.debug('  f     = 0x%08x' % (f))
-                logging.debug('  g     = 0x%08x' % (g))
-                logging.debug('  h     = 0x%08x' % (h))
-
-        for i, (x, y) in enumerate(zip(self._h, [a, b, c, d, e, f, g, h])):
-            self._h[i] = (x + y) & Sha256bit.F32
+            tracer(
+                'round',
+                {
+                    'i': i,
+                    'k': Sha256bit.K[i],
+                    'w': w[i],
+                    's0': s0,
+                    's1': s1,
+                    't1': t1,
+                    't2': t2,
+                    'a': a,
+                    'b': b,
+                    'c': c,
+                    'd': d,
+                    'e': e,
+                    'f': f,
+                    'g': g,
+                    'h': hh,
+                },
+            )
+
+        for i, (x, y) in enumerate(zip(h, [a, b, c, d, e, f, g, hh])):
+            h[i] = (x + y) & Sha256bit.F32
 
     def update(self, m, *, bitlen=None):
         """Update the hash object with the bytes in data. Repeated calls
         are equivalent to a single call with the concatenation of all
         the arguments.
+
+        m can be any object supporting the buffer protocol, it is not copied:
+        full blocks are compressed straight from it and only the trailing
+        partial block is kept.
+
+        If bitlen is not None, only the first bitlen bits of m are used.
+        Calls with a bitlen which is not a multiple of 8 can be followed
+        by other calls: the bits of the next call are appended right after.
         """
-        if not m:
+        if m is None:
             return
-        if self._has_bitlen:
-            raise AssertionError('we support bitlen only for last call')
-        bytes_bitlen = len(m) * 8
-        if bitlen is not None:
-            if 0 != (bitlen % 8):
-                self._has_bitlen = True
-                if bytes_bitlen - bitlen >= 8 or bitlen >= bytes_bitlen:
-                    raise AssertionError(
-                        'bitlen=%d, bytes_bitlen=%d'
-                        % (
-                            bitlen,
-                            bytes_bitlen,
-                        )
-                    )
-            else:
-                if bitlen != bytes_bitlen:
-                    raise AssertionError(
-                        'bitlen=%d, bytes_bitlen=%d'
-                        % (
-                            bitlen,
-                            bytes_bitlen,
-                        )
-                    )
-            self._counter += bitlen
+        if perf._enabled:
+            perf._update(self, m, bitlen)
         else:
-            self._counter += bytes_bitlen
-
-        self._cache += m
+            self._update(m, bitlen)
 
-        while len(self._cache) > 64:
-            self._compress(self._cache[:64])
-            self._cache = self._cache[64:]
+    def _update(self, m, bitlen):
+        m = memoryview(m).cast('B')
+        n = len(m)
+        if not n:
+            return
+        bitlen = _check_bitlen(n, bitlen)
+        if self._counter % 8:
+            self._update_unaligned(m, bitlen)
+        else:
+            self._update_aligned(m, bitlen)
 
-        if len(self._cache) == 64 and 0 == (self._counter % 8):
-            self._compress(self._cache[:64])
-            self._cache = self._cache[64:]
+    def update_many(self, buffers, *, bitlen=None):
+        """Update the hash object with the concatenation of buffers, an iterable of bytes-like objects.
 
-    def _pad(self):
-        last_block_bitlen = self._counter % 512
-        last_block_full_bytes_cnt = last_block_bitlen // 8
-        if last_block_bitlen < 448:
-            padlen = 55 - last_block_full_bytes_cnt
+        Same as update(b''.join(buffers), bitlen=bitlen) without joining:
+        blocks are assembled across fragment boundaries in the partial
+        block cache and compressed as soon as they are complete. If bitlen
+        is not None, it is the bit length of the concatenation, the last
+        bits are taken from the last non empty fragment. If an error occurs,
+        the hash object is left unchanged.
+        """
+        if perf._enabled:
+            perf._update_many(self, buffers, bitlen)
         else:
-            padlen = 119 - last_block_full_bytes_cnt
-
-        shift = self._counter % 8
+            self._update_many(buffers, bitlen, self._compress)
+
+    def _update_many(self, buffers, bitlen, compress):
+        saved = (self._counter, self._cache_len, self._h[:], bytes(self._cache))
+        try:
+            self._absorb_many(buffers, bitlen, compress)
+        except BaseException:
+            self._counter, self._cache_len, self._h[:], self._cache[:] = saved
+            raise
+
+    def _absorb_many(self, buffers, bitlen, compress):
+        # fragments are absorbed one step late: the last non empty one goes
+        # through update() with the remaining bits
+        last = None
+        done = 0
+        if self._counter % 8:
+            for b in buffers:
+                m = memoryview(b).cast('B')
+                if len(m):
+                    if last is not None:
+                        self.update(last)
+                        done += len(last)
+                    last = m
+        else:
+            cache = self._cache
+            cache_len = self._cache_len
+            h = self._h
+            for b in buffers:
+                m = memoryview(b).cast('B')
+                n = len(m)
+                if not n:
+                    continue
+                if last is not None:
+                    k = len(last)
+                    done += k
+                    pos = 0
+                    if cache_len:
+                        if cache_len + k < 64:
+                            cache[cache_len : cache_len + k] = last
+                            cache_len += k
+                            last = m
+                            continue
+                        pos = 64 - cache_len
+                        cache[cache_len:] = last[:pos]
+                        compress(h, cache)
+                    if k - pos >= 64:
+                        run = k - pos - (k - pos) % 64
+                        compress(h, last[pos : pos + run])
+                        pos += run
+                    cache_len = k - pos
+                    cache[:cache_len] = last[pos:]
+                last = m
+            self._cache_len = cache_len
+            self._counter += done * 8
+        if last is None:
+            _check_bitlen(0, bitlen)
+        else:
+            self.update(last, bitlen=None if bitlen is None else bitlen - done * 8)
 
-        if self._verbose:
-            logging.debug('bitlen = %d' % self._counter)
-            logging.debug('last_block_bitlen = %d' % last_block_bitlen)
-            logging.debug('last_block_full_bytes_cnt = %d' % last_block_full_bytes_cnt)
-            logging.debug('padlen = %d' % padlen)
-            logging.debug('shift = %d' % shift)
+    def digest_at(self, m, bit_offsets, *, bitlen=None):
+        """Update the hash object with m, yield (offset, digest) for each offset of bit_offsets.
 
-        if shift > 0 and (len(self._cache) > 0):
-            mask = 0xFF << (8 - shift)
-            self._cache[-1] = (self._cache[-1] & mask) | (0x80 >> shift)
+        An offset is the bit length of the message hashed so far, including
+        the data passed before m. Offsets must be in ascending order. Each
+        digest is computed from a scratch copy of the running state, m is
+        read only once. m is fully absorbed when the generator is exhausted.
+        """
+        m = memoryview(b'' if m is None else m).cast('B')
+        bitlen = _check_bitlen(len(m), bitlen)
+        start = self._counter
+        done = 0
+        for offset in bit_offsets:
+            if not done <= offset - start <= bitlen:
+                raise AssertionError('offset=%d, expected in [%d, %d]' % (offset, start + done, start + bitlen))
+            end = (offset - start) // 8
+            if end * 8 > done:
+                self.update(m[done // 8 : end], bitlen=end * 8 - done)
+                done = end * 8
+            nbits = offset - start - done
+            if nbits:
+                scratch = self.copy()
+                scratch.update(m[end : end + 1], bitlen=nbits)
+                yield offset, scratch.digest()
+            else:
+                yield offset, self.digest()
+        if done < bitlen:
+            self.update(m[done // 8 :], bitlen=bitlen - done)
+
+    def _update_unaligned(self, m, bitlen):
+        # Move the pending bits of the last partial byte out of the cache, then
+        # shift the new bits behind them chunk by chunk: the bytes built this
+        # way are byte aligned again and the remaining bits form the new
+        # partial byte.
+        nbits = self._counter % 8
+        self._cache_len -= 1
+        self._counter -= nbits
+        pending = self._cache[self._cache_len] >> (8 - nbits)
+        chunk_size = _UNALIGNED_CHUNK_SIZE
+        for pos in range(0, len(m), chunk_size):
+            chunk = m[pos : pos + chunk_size]
+            chunk_bitlen = min(len(chunk) * 8, bitlen - pos * 8)
+            value = int.from_bytes(chunk, byteorder='big') >> (len(chunk) * 8 - chunk_bitlen)
+            value |= pending << chunk_bitlen
+            nbits += chunk_bitlen
+            pending = value & ((1 << (nbits % 8)) - 1)
+            if nbits >= 8:
+                self._update_aligned((value >> (nbits % 8)).to_bytes(nbits // 8, byteorder='big'), nbits & ~7)
+            nbits %= 8
+        if nbits:
+            self._update_aligned(bytes([(pending << (8 - nbits)) & 0xFF]), nbits)
+
+    def _update_aligned(self, m, bitlen):
+        if perf._enabled:
+            perf._update_aligned(self, m, bitlen)
         else:
-            self._cache += b'\x80'
+            self._absorb(m, bitlen, self._compress)
+
+    def _absorb(self, m, bitlen, compress):
+        n = len(m)
+        self._counter += bitlen
+
+        # a full block is kept in cache only if it ends with a partial byte, _pad needs to patch it
+        aligned = 0 == (self._counter % 8)
+        h = self._h
+        cache = self._cache
+        pos = 0
+        if self._cache_len:
+            pos = min(64 - self._cache_len, n)
+            cache[self._cache_len : self._cache_len + pos] = m[:pos]
+            self._cache_len += pos
+            if self._cache_len < 64 or (pos == n and not aligned):
+                return
+            compress(h, cache)
+            self._cache_len = 0
+
+        end = n if aligned else n - 1
+        if end - pos >= 64:
+            run = end - pos - (end - pos) % 64
+            compress(h, m[pos : pos + run])
+            pos += run
+
+        self._cache_len = n - pos
+        cache[: self._cache_len] = m[pos:]
+
+    def update_from_file(self, file, *, bitlen=None, buffer_size=1 << 16, use_mmap=False):
+        """Update the hash object with the content of file, a path or a binary file object.
+
+        Data is read from the current position until the end of the file or,
+        if bitlen is not None, until bitlen bits are read. The last byte is
+        then partially used if bitlen is not a multiple of 8.
+        Data is read into one reusable buffer of buffer_size bytes (rounded to
+        a multiple of the block size) or, if use_mmap is True, the file is
+        memory mapped.
+        """
+        if isinstance(file, (str, bytes, os.PathLike)):
+            with open(file, 'rb') as f:
+                self._update_from_fileobj(f, bitlen, buffer_size, use_mmap)
+        else:
+            self._update_from_fileobj(file, bitlen, buffer_size, use_mmap)
+
+    def _update_from_fileobj(self, f, bitlen, buffer_size, use_mmap):
+        nbytes = None if bitlen is None else (bitlen + 7) // 8
+        if use_mmap:
+            start = f.tell()
+            size = os.fstat(f.fileno()).st_size - start
+            if nbytes is None:
+                nbytes = size
+            if nbytes > size:
+                raise AssertionError('bitlen=%d, file bitlen=%d' % (bitlen, size * 8))
+            if nbytes:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    try:
+                        self.update(view[start : start + nbytes], bitlen=bitlen)
+                    finally:
+                        view.release()
+            f.seek(start + nbytes)
+            return
 
-        self._cache += (b'\x00' * padlen) + self._counter.to_bytes(8, byteorder='big')
+        buffer_size = max(64, buffer_size - buffer_size % 64)
+        buf = bytearray(buffer_size if nbytes is None else min(buffer_size, nbytes))
+        view = memoryview(buf)
+        readinto = f.readinto
+        done = 0
+        while nbytes is None or done < nbytes:
+            want = len(buf) if nbytes is None else min(len(buf), nbytes - done)
+            n = readinto(view[:want])
+            if not n:
+                break
+            done += n
+            if nbytes is not None and done == nbytes:
+                self.update(view[:n], bitlen=bitlen - (done - n) * 8)
+            else:
+                self.update(view[:n])
+        if nbytes is not None and done < nbytes:
+            raise AssertionError('bitlen=%d, file bitlen=%d' % (bitlen, done * 8))
 
-        if len(self._cache) not in [64, 128]:
-            raise AssertionError('len(self._cache)=%d' % len(self._cache))
+    def _pad(self):
+        if perf._enabled:
+            perf._count('pads')
+        if self._tracer is not None:
+            last_block_bitlen, last_block_full_bytes_cnt, padlen, shift = _pad_params(self._counter)
+            self._tracer(
+                'pad',
+                {
+                    'bitlen': self._counter,
+                    'last_block_bitlen': last_block_bitlen,
+                    'last_block_full_bytes_cnt': last_block_full_bytes_cnt,
+                    'padlen': padlen,
+                    'shift': shift,
+                },
+            )
+
+        return _pad(self._cache[: self._cache_len], self._counter)
 
     def digest(self):
         """Return the digest of the bytes passed to the update() method
         so far as a bytes object.
+        The hash object is not modified, update() can still be called.
         """
+        if perf._enabled:
+            return perf._digest(self)
+        return self._finalize(self._compress)
+
+    def _finalize(self, compress):
         if self._digest is not None:
             return self._digest
-        if self._verbose:
-            logging.info('bitlen: %d' % self._counter)
-
-        self._pad()
-        blocks = [self._cache[i : i + 64] for i in range(0, len(self._cache), 64)]
-        for b in blocks:
-            self._compress(b)
-        data = [struct.pack('!L', i) for i in self._h[: self._output_size]]
-        self._digest = b''.join(data)
-        if self._verbose:
-            logging.debug('state:  ' + Utils.hexstr(self._state_bytes()))
-            logging.info('digest: ' + Utils.hexstr(self._digest))
+        if self._tracer is not None:
+            self._tracer('finalize', {'bitlen': self._counter})
+
+        h = list(self._h)
+        compress(h, self._pad())
+        digest = b''.join([struct.pack('!L', i) for i in h[: self._output_size]])
+        if self._tracer is not None:
+            self._tracer('digest', {'state': tuple(h), 'digest': digest})
+
+        return digest
+
+    def copy(self):
+        """Return a copy of the hash object"""
+
+        o = type(self).__new__(type(self))
+        o._tracer = self._tracer
+        o._counter = self._counter
+        o._cache = bytearray(self._cache) if self._cache is not None else None
+        o._cache_len = self._cache_len
+        o._h = self._h[:] if self._h is not None else None
+        o._digest = self._digest
+        o._compress = self._compress
+        return o
 
-        self._cache = None
-        self._h = None
+    def reset(self):
+        """Reinitialize the hash object to the state of a new instance, reusing its buffers"""
 
-        return self._digest
+        self._counter = 0
+        self._cache_len = 0
+        self._digest = None
+        if self._h is None:
+            # imported from a finalized state
+            self._h = array(_WORD, _H_INIT)
+            self._cache = bytearray(64)
+        else:
+            self._h[:] = _H_INIT
 
     def hexdigest(self):
         """Like digest() except the digest is returned as a string
         of double length, containing only hexadecimal digits.
         """
         return binascii.hexlify(self.digest()).decode('ascii')
+
+
+# the state is 8 unsigned 32 bits words
+_WORD = 'I' if array('I').itemsize == 4 else 'L'
+_H_INIT = array(_WORD, Sha256bit.H_INIT)
+_UNALIGNED_CHUNK_SIZE = 4096
+_engines: dict = {}
+
+
+def _get_engine(name):
+    # the default backend (name None) is resolved once, on first use
+    _engines[name] = backend.get_engine(name)
+    return _engines[name]
+
+
+_STATE_VERSION = 1
+_STATE_HEADER = struct.Struct('!B8LQB')
+_FINALIZED = 0xFF
+
+
+def _check_bitlen(nbytes, bitlen):
+    """Return the bit length of a nbytes bytes message, bitlen if it is consistent with nbytes"""
+
+    bytes_bitlen = nbytes * 8
+    if bitlen is None:
+        return bytes_bitlen
+    if 0 != (bitlen % 8):
+        if bytes_bitlen - bitlen >= 8 or bitlen >= bytes_bitlen:
+            raise AssertionError(
+                'bitlen=%d, bytes_bitlen=%d'
+                % (
+                    bitlen,
+                    bytes_bitlen,
+                )
+            )
+    else:
+        if bitlen != bytes_bitlen:
+            raise AssertionError(
+                'bitlen=%d, bytes_bitlen=%d'
+                % (
+                    bitlen,
+                    bytes_bitlen,
+                )
+            )
+    return bitlen
+
+
+def _pad_params(bitlen):
+    last_block_bitlen = bitlen % 512
+    last_block_full_bytes_cnt = last_block_bitlen // 8
+    if last_block_bitlen < 448:
+        padlen = 55 - last_block_full_bytes_cnt
+    else:
+        padlen = 119 - last_block_full_bytes_cnt
+    return last_block_bitlen, last_block_full_bytes_cnt, padlen, bitlen % 8
+
+
+def _pad(last, bitlen):
+    """Pad last, the trailing partial block of a message of bitlen bits, in place.
+    Return last, which is then 1 or 2 blocks long.
+    """
+
+    _, _, padlen, shift = _pad_params(bitlen)
+    if shift > 0 and (len(last) > 0):
+        mask = 0xFF << (8 - shift)
+        last[-1] = (last[-1] & mask) | (0x80 >> shift)
+    else:
+        last += b'\x80'
+
+    last += (b'\x00' * padlen) + bitlen.to_bytes(8, byteorder='big')
+
+    if len(last) not in [64, 128]:
+        raise AssertionError('len(last)=%d' % len(last))
+    return last
+
+
+_K = Sha256bit.K
+_F32 = Sha256bit.F32
+_unpack16_from = struct.Struct('!16L').unpack_from
+
+
+def _compress(h, blocks, _k=_K, _f32=_F32, _unpack16_from=_unpack16_from, _add=operator.add):
+    """Fast compression engine: update the 8 words of h in place with blocks, a multiple of 64 bytes.
+
+    Rotations, maj and ch are inlined, the message schedule and the per-round constants
+    K[i] + W[i] are computed upfront so the round loop only touches local variables.
+    """
+
+    h0, h1, h2, h3, h4, h5, h6, h7 = h
+    for offset in range(0, len(blocks), 64):
+        w = list(_unpack16_from(blocks, offset))
+        for i in range(16, 64):
+            x = w[i - 15]
+            y = w[i - 2]
+            s0 = ((x >> 7) | (x << 25)) ^ ((x >> 18) | (x << 14)) ^ (x >> 3)
+            s1 = ((y >> 17) | (y << 15)) ^ ((y >> 19) | (y << 13)) ^ (y >> 10)
+            w.append((w[i - 16] + s0 + w[i - 7] + s1) & _f32)
+
+        a, b, c, d, e, f, g, hh = h0, h1, h2, h3, h4, h5, h6, h7
+        for kw in map(_add, _k, w):
+            s1 = (((e >> 6) | (e << 26)) ^ ((e >> 11) | (e << 21)) ^ ((e >> 25) | (e << 7))) & _f32
+            t1 = hh + s1 + (g ^ (e & (f ^ g))) + kw
+            s0 = (((a >> 2) | (a << 30)) ^ ((a >> 13) | (a << 19)) ^ ((a >> 22) | (a << 10))) & _f32
+            t2 = s0 + ((a & b) | (c & (a | b)))
+            hh = g
+            g = f
+            f = e
+            e = (d + t1) & _f32
+            d = c
+            c = b
+            b = a
+            a = (t1 + t2) & _f32
+
+        h0 = (h0 + a) & _f32
+        h1 = (h1 + b) & _f32
+        h2 = (h2 + c) & _f32
+        h3 = (h3 + d) & _f32
+        h4 = (h4 + e) & _f32
+        h5 = (h5 + f) & _f32
+        h6 = (h6 + g) & _f32
+        h7 = (h7 + hh) & _f32
+    h[0], h[1], h[2], h[3], h[4], h[5], h[6], h[7] = h0, h1, h2, h3, h4, h5, h6, h7
+
+
+def _schedule(w):
+    """Extend the 16 words of w to the 64 words of the message schedule"""
+
+    for i in range(16, 64):
+        x = w[i - 15]
+        y = w[i - 2]
+        s0 = ((x >> 7) | (x << 25)) ^ ((x >> 18) | (x << 14)) ^ (x >> 3)
+        s1 = ((y >> 17) | (y << 15)) ^ ((y >> 19) | (y << 13)) ^ (y >> 10)
+        w.append((w[i - 16] + s0 + w[i - 7] + s1) & _F32)
+    return w
+
+
+def _rounds(v, kws, _f32=_F32):
+    """Run one round per item of kws (K[i] + W[i]) on the working variables v, return the new ones"""
+
+    a, b, c, d, e, f, g, hh = v
+    for kw in kws:
+        s1 = (((e >> 6) | (e << 26)) ^ ((e >> 11) | (e << 21)) ^ ((e >> 25) | (e << 7))) & _f32
+        t1 = hh + s1 + (g ^ (e & (f ^ g))) + kw
+        s0 = (((a >> 2) | (a << 30)) ^ ((a >> 13) | (a << 19)) ^ ((a >> 22) | (a << 10))) & _f32
+        t2 = s0 + ((a & b) | (c & (a | b)))
+        hh = g
+        g = f
+        f = e
+        e = (d + t1) & _f32
+        d = c
+        c = b
+        b = a
+        a = (t1 + t2) & _f32
+    return a, b, c, d, e, f, g, hh
+
+
+def _compress_kw(h, kws):
+    """Like _compress, with the K[i] + W[i] values of the block already computed"""
+
+    v = _rounds(h, kws)
+    for i in range(8):
+        h[i] = (h[i] + v[i]) & _F32
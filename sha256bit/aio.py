@@ -0,0 +1,187 @@
+"""asyncio integration: hash streams without blocking the event loop.
+
+AsyncSha256bit wraps a Sha256bit. Updates of at least offload_size bytes are
+compressed in an executor (the loop default thread pool if none is given) so
+the event loop keeps serving other tasks; smaller updates are hashed inline.
+The compression releases the GIL with the openssl backend, with the python
+backend the event loop still gets the GIL at each thread switch interval.
+
+update_from_stream reads an asyncio.StreamReader or an async iterator of
+chunks, gathers the chunks into block aligned batches of about batch_size
+bytes and hashes one batch while reading the next one. At most two batches
+are held in memory: reading waits for the previous batch to be hashed, so a
+StreamReader applies backpressure to its transport when hashing is slower
+than the network.
+"""
+
+import asyncio
+import functools
+import inspect
+
+from sha256bit import Sha256bit
+
+OFFLOAD_SIZE = 1 << 16
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 1 << 20
+
+
+async def _chunks(source, chunk_size):
+    if hasattr(source, 'read'):
+        while True:
+            chunk = await source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+class AsyncSha256bit:
+    """Sha256bit with coroutine updates, the synchronous hasher is the hasher attribute"""
+
+    digest_size = Sha256bit.digest_size
+    block_size = Sha256bit.block_size
+
+    def __init__(self, m=None, *, bitlen=None, tracer=None, backend=None, executor=None, offload_size=OFFLOAD_SIZE):
+        """m, bitlen, tracer and backend are passed to Sha256bit.
+
+        executor defaults to the loop default executor, it must run callables
+        in the current process (threads).
+        """
+
+        self.hasher = Sha256bit(m, bitlen=bitlen, tracer=tracer, backend=backend)
+        self._executor = executor
+        self._offload_size = offload_size
+        self._lock = None
+        self._pending = None
+
+    @staticmethod
+    def from_hasher(hasher, *, executor=None, offload_size=OFFLOAD_SIZE):
+        """Wrap an existing Sha256bit, for example one restored with Sha256bit.import_state"""
+
+        o = AsyncSha256bit(executor=executor, offload_size=offload_size)
+        o.hasher = hasher
+        return o
+
+    def _get_lock(self):
+        # created lazily: before Python 3.10 a Lock is bound to the loop current at creation
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _settle(self):
+        """Wait for an offloaded update whose caller was cancelled"""
+
+        if self._pending is not None:
+            await asyncio.wait([self._pending])
+            self._pending = None
+
+    def _check_idle(self):
+        if self._pending is not None and not self._pending.done():
+            raise AssertionError('an update is running in the executor')
+
+    def _start(self, m, bitlen=None):
+        """Hash m inline or start hashing it in the executor, return the future or None"""
+
+        if len(m) < self._offload_size:
+            self.hasher.update(m, bitlen=bitlen)
+            return None
+        loop = asyncio.get_running_loop()
+        self._pending = loop.run_in_executor(self._executor, functools.partial(self.hasher.update, m, bitlen=bitlen))
+        return self._pending
+
+    async def _finish(self, future):
+        if future is not None:
+            # shielded: cancelling the caller must not detach a running update
+            await asyncio.shield(future)
+            self._pending = None
+
+    async def update(self, m, *, bitlen=None):
+        """Update the hash with m, see Sha256bit.update.
+
+        m must not be modified before the coroutine returns.
+        """
+
+        async with self._get_lock():
+            await self._settle()
+            await self._finish(self._start(memoryview(m).cast('B'), bitlen))
+
+    async def update_from_stream(self, source, *, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, on_checkpoint=None):
+        """Update the hash with all the bytes of source, return the number of bytes read.
+
+        source is an asyncio.StreamReader (read by chunk_size bytes) or an async
+        iterator of buffers. After each batch is hashed, on_checkpoint, if
+        given, is called with the number of bytes hashed so far and
+        export_state(); it can be a coroutine function.
+        """
+
+        if batch_size < 64:
+            raise AssertionError('batch_size=%d, min is 64' % batch_size)
+        async with self._get_lock():
+            await self._settle()
+            # batches end on a block boundary of the whole message
+            offset = ((self.hasher._counter + 7) // 8) % 64
+            total = 0
+            hashed = 0
+            buf = bytearray()
+            future = None
+            in_flight = 0
+            async for chunk in _chunks(source, chunk_size):
+                buf += chunk
+                total += len(chunk)
+                if len(buf) < batch_size:
+                    continue
+                n = len(buf) - (offset + total) % 64
+                batch = buf[:n]
+                del buf[:n]
+                await self._finish(future)
+                hashed += in_flight
+                await self._checkpoint(on_checkpoint, hashed, in_flight)
+                future = self._start(batch)
+                in_flight = len(batch)
+            await self._finish(future)
+            hashed += in_flight
+            await self._checkpoint(on_checkpoint, hashed, in_flight)
+            if buf:
+                await self._finish(self._start(buf))
+                await self._checkpoint(on_checkpoint, total, len(buf))
+            return total
+
+    async def _checkpoint(self, on_checkpoint, hashed, batch_len):
+        if on_checkpoint is None or not batch_len:
+            return
+        r = on_checkpoint(hashed, self.hasher.export_state())
+        if inspect.isawaitable(r):
+            await r
+
+    async def checkpoint(self):
+        """Return export_state() once the running updates are done"""
+
+        async with self._get_lock():
+            await self._settle()
+            return self.hasher.export_state()
+
+    def export_state(self):
+        self._check_idle()
+        return self.hasher.export_state()
+
+    def digest(self):
+        self._check_idle()
+        return self.hasher.digest()
+
+    def hexdigest(self):
+        self._check_idle()
+        return self.hasher.hexdigest()
+
+    def copy(self):
+        self._check_idle()
+        return AsyncSha256bit.from_hasher(self.hasher.copy(), executor=self._executor, offload_size=self._offload_size)
+
+
+async def hash_stream(source, *, backend=None, executor=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """Return the digest of all the bytes of source, see AsyncSha256bit.update_from_stream"""
+
+    h = AsyncSha256bit(backend=backend, executor=executor)
+    await h.update_from_stream(source, chunk_size=chunk_size, batch_size=batch_size)
+    return h.digest()
@@ -0,0 +1,158 @@
+"""Block compression backends.
+
+Only the compression of 64 bytes blocks is delegated to a backend, padding,
+bit counter and state import/export stay in Sha256bit. An engine compresses
+a run of full blocks per call. Backends:
+
+- ``'python'``: pure python engine, always available
+- ``'openssl'``: SHA256_Update from the system libcrypto, loaded with ctypes
+- ``'auto'``: ``'openssl'`` if available, ``'python'`` otherwise
+
+The default backend is given by the SHA256BIT_BACKEND environment variable,
+``'auto'`` if not set. It is read once, when the first Sha256bit instance is
+created. It can be overridden with the backend parameter of Sha256bit.
+"""
+
+import ctypes
+import os
+import sys
+import threading
+
+ENV_VAR = 'SHA256BIT_BACKEND'
+
+_LIBCRYPTO_NAMES = {
+    'linux': ['libcrypto.so.3', 'libcrypto.so.1.1', 'libcrypto.so'],
+    'darwin': ['libcrypto.3.dylib', 'libcrypto.1.1.dylib', 'libcrypto.dylib'],
+    'win32': ['libcrypto-3-x64.dll', 'libcrypto-3.dll', 'libcrypto-1_1-x64.dll', 'libcrypto-1_1.dll'],
+}
+
+# bytes copied at once when the blocks are in a read only buffer, ctypes only takes writable ones without copy
+_COPY_SIZE = 1 << 16
+
+_engines: dict = {}
+
+
+class _Sha256Ctx(ctypes.Structure):
+    _fields_ = [
+        ('h', ctypes.c_uint32 * 8),
+        ('nl', ctypes.c_uint32),
+        ('nh', ctypes.c_uint32),
+        ('data', ctypes.c_uint32 * 16),
+        ('num', ctypes.c_uint),
+        ('md_len', ctypes.c_uint),
+    ]
+
+
+def _load_functions(name):
+    try:
+        lib = ctypes.CDLL(name)
+        init = lib.SHA256_Init
+        update = lib.SHA256_Update
+    except (OSError, AttributeError):
+        return None
+    init.argtypes = [ctypes.POINTER(_Sha256Ctx)]
+    update.argtypes = [ctypes.POINTER(_Sha256Ctx), ctypes.c_void_p, ctypes.c_size_t]
+    return init, update
+
+
+def _load_libcrypto():
+    for name in _LIBCRYPTO_NAMES.get(sys.platform, []):
+        functions = _load_functions(name)
+        if functions is not None:
+            return functions
+    # find_library may spawn processes and ctypes.util is slow to import, keep it as last resort
+    import ctypes.util
+
+    name = ctypes.util.find_library('crypto')
+    return None if name is None else _load_functions(name)
+
+
+class _OpenSSLEngine:
+    """Compress blocks with SHA256_Update on a context which is never finalized.
+
+    Only full blocks are passed, so libcrypto never buffers anything and the
+    context words are the state. Each thread reuses its own context.
+    Instances pickle as a reference to the backend, libcrypto is loaded
+    again by the process which unpickles them.
+    """
+
+    def __init__(self, init, update):
+        self._init = init
+        self._update = update
+        self._local = threading.local()
+
+    def __reduce__(self):
+        return get_engine, ('openssl',)
+
+    def _ctx(self):
+        ctx = _Sha256Ctx()
+        self._init(ctx)
+        self._local.ctx = ctx
+        return ctx
+
+    def __call__(self, h, blocks):
+        try:
+            ctx = self._local.ctx
+        except AttributeError:
+            ctx = self._ctx()
+        ctx.h[:] = h
+        update = self._update
+        if type(blocks) is bytes:
+            update(ctx, blocks, len(blocks))
+        else:
+            blocks = memoryview(blocks).cast('B')
+            if blocks.readonly:
+                for pos in range(0, len(blocks), _COPY_SIZE):
+                    chunk = blocks[pos : pos + _COPY_SIZE].tobytes()
+                    update(ctx, chunk, len(chunk))
+            else:
+                update(ctx, ctypes.addressof(ctypes.c_char.from_buffer(blocks)), len(blocks))
+        # element wise: h is a list or an array
+        h[0], h[1], h[2], h[3], h[4], h[5], h[6], h[7] = ctx.h
+
+
+def _openssl_engine():
+    functions = _load_libcrypto()
+    return None if functions is None else _OpenSSLEngine(*functions)
+
+
+def _python_engine():
+    from sha256bit import _compress
+
+    return _compress
+
+
+_loaders = {'python': _python_engine, 'openssl': _openssl_engine}
+
+
+def _engine(name):
+    if name not in _engines:
+        _engines[name] = _loaders[name]()
+    return _engines[name]
+
+
+def available_backends():
+    """Return the names of the backends which can be used on this host"""
+
+    return [name for name in _loaders if _engine(name) is not None]
+
+
+def get_engine(name=None):
+    """Return the compression function of backend name.
+
+    The compression function updates a list or an array of 8 words in place
+    with blocks, a buffer whose length is a multiple of 64 bytes.
+    If name is None, the default backend is used.
+    """
+
+    if name is None:
+        name = os.environ.get(ENV_VAR, 'auto')
+    if name == 'auto':
+        engine = _engine('openssl')
+        return engine if engine is not None else _engine('python')
+    if name not in _loaders:
+        raise AssertionError('unknown backend %s, expected one of auto, %s' % (name, ', '.join(_loaders)))
+    engine = _engine(name)
+    if engine is None:
+        raise AssertionError('backend %s is not available' % name)
+    return engine
@@ -0,0 +1,102 @@
+"""Batch hashing of many independent messages.
+
+With NumPy installed, messages with the same number of blocks are hashed
+together: each message is a lane of uint32 arrays and the compression
+function runs once per block index for the whole group. Without NumPy,
+messages are hashed one after the other with the pure python engine.
+"""
+
+from sha256bit import Sha256bit, _check_bitlen, _compress, _pad
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore[assignment]
+
+
+def _padded(m, bitlen):
+    m = memoryview(m).cast('B')
+    bitlen = _check_bitlen(len(m), bitlen)
+    full = (bitlen // 512) * 64
+    return m[:full].tobytes() + _pad(bytearray(m[full:]), bitlen)
+
+
+def hash_many(messages, bitlens=None, *, use_numpy=None):
+    """Return the list of the digests of messages.
+
+    bitlens, if not None, gives the bit length of each message, with the
+    same semantic as the bitlen parameter of Sha256bit.
+    use_numpy selects the engine, by default NumPy is used if available.
+    """
+
+    messages = list(messages)
+    bitlens = [None] * len(messages) if bitlens is None else list(bitlens)
+    if len(bitlens) != len(messages):
+        raise AssertionError('len(bitlens)=%d, len(messages)=%d' % (len(bitlens), len(messages)))
+    padded = [_padded(m, bitlen) for m, bitlen in zip(messages, bitlens)]
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if not use_numpy:
+        return [_hash_padded(p) for p in padded]
+
+    groups = {}
+    for i, p in enumerate(padded):
+        groups.setdefault(len(p), []).append(i)
+    digests = [None] * len(padded)
+    for length, indexes in groups.items():
+        data = b''.join([padded[i] for i in indexes])
+        words = numpy.frombuffer(data, dtype='>u4').astype(numpy.uint32)
+        # one row per word of the padded message, one column per lane
+        words = words.reshape(len(indexes), length // 4).T
+        h = [numpy.full(len(indexes), x, dtype=numpy.uint32) for x in Sha256bit.H_INIT]
+        for offset in range(0, length // 4, 16):
+            h = _compress_lanes(h, words[offset : offset + 16])
+        out = numpy.stack(h, axis=1).astype('>u4').tobytes()
+        for lane, i in enumerate(indexes):
+            digests[i] = out[lane * 32 : lane * 32 + 32]
+    return digests
+
+
+def _hash_padded(padded):
+    h = list(Sha256bit.H_INIT)
+    _compress(h, padded)
+    return b''.join([x.to_bytes(4, byteorder='big') for x in h])
+
+
+def _rotr(x, n):
+    return (x >> n) | (x << (32 - n))
+
+
+if numpy is not None:
+    _K = numpy.array(Sha256bit.K, dtype=numpy.uint32)
+
+
+def _compress_lanes(h, block):
+    """Compression function on uint32 lanes: h is a list of 8 arrays, block a (16, lanes) array.
+    Return the new list of 8 arrays, additions wrap modulo 2**32 like uint32 arithmetic.
+    """
+
+    w = list(block)
+    for i in range(16, 64):
+        x = w[i - 15]
+        y = w[i - 2]
+        s0 = _rotr(x, 7) ^ _rotr(x, 18) ^ (x >> 3)
+        s1 = _rotr(y, 17) ^ _rotr(y, 19) ^ (y >> 10)
+        w.append(w[i - 16] + s0 + w[i - 7] + s1)
+
+    a, b, c, d, e, f, g, hh = h
+    for i in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        t1 = hh + s1 + (g ^ (e & (f ^ g))) + _K[i] + w[i]
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        t2 = s0 + ((a & b) | (c & (a | b)))
+        hh = g
+        g = f
+        f = e
+        e = d + t1
+        d = c
+        c = b
+        b = a
+        a = t1 + t2
+
+    return [x + y for x, y in zip(h, (a, b, c, d, e, f, g, hh))]
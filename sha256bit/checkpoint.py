@@ -0,0 +1,208 @@
+"""Resumable hashing of large files.
+
+ResumableFileHash hashes a file and periodically saves its progress in a
+small sidecar file: the export_state_bytes() of the hasher and the number
+of bytes of the file absorbed so far. A new run on the same file resumes
+from the last checkpoint instead of starting again from byte 0.
+
+A checkpoint is written to a temporary file which then replaces the
+sidecar, a crash leaves either the previous or the new checkpoint. Before
+resuming, the size and modification time of the file must match the ones
+recorded in the checkpoint and, optionally, the digests of samples read
+from the already hashed part of the file. Otherwise the checkpoint is
+discarded and hashing starts from byte 0.
+
+The sidecar is a JSON document, it is deleted once the file is fully hashed.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from sha256bit import Sha256bit
+
+SUFFIX = '.sha256bit-checkpoint'
+FORMAT_VERSION = 1
+SAMPLE_SIZE = 4096
+
+
+def _sample_offsets(end, samples):
+    """Return the offsets of samples spread evenly over the first end bytes of the file"""
+
+    if not samples or end < SAMPLE_SIZE:
+        return []
+    last = end - SAMPLE_SIZE
+    if samples == 1:
+        return [0]
+    return sorted({last * i // (samples - 1) for i in range(samples)})
+
+
+def _sample_digests(f, offsets):
+    digests = []
+    for offset in offsets:
+        f.seek(offset)
+        digests.append(hashlib.sha256(f.read(SAMPLE_SIZE)).hexdigest())
+    return digests
+
+
+def _write_atomic(path, data):
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # make the rename itself durable, not supported on all platforms
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ResumableFileHash:
+    """Hash of a file which survives interruptions"""
+
+    def __init__(
+        self,
+        path,
+        *,
+        checkpoint_path=None,
+        bitlen=None,
+        interval_bytes=1 << 30,
+        interval_seconds=60.0,
+        samples=0,
+        backend=None,
+        buffer_size=1 << 20,
+    ):
+        """Prepare to hash the file at path, or its first bitlen bits.
+
+        A checkpoint is saved to checkpoint_path, by default path + SUFFIX,
+        each time interval_bytes bytes were hashed or interval_seconds
+        elapsed since the last one, whichever comes first. Either interval
+        can be None. samples is the number of blocks of SAMPLE_SIZE bytes
+        whose digests are recorded in each checkpoint and verified on resume.
+        """
+
+        self.path = os.fspath(path)
+        self.checkpoint_path = self.path + SUFFIX if checkpoint_path is None else os.fspath(checkpoint_path)
+        self.bitlen = bitlen
+        self.interval_bytes = interval_bytes
+        self.interval_seconds = interval_seconds
+        self.samples = samples
+        self._backend = backend
+        self._buffer_size = max(64, buffer_size - buffer_size % 64)
+        self.resumed_offset = 0
+        self.discarded = None
+        self.checkpoints = 0
+
+    def _file_id(self, f):
+        st = os.fstat(f.fileno())
+        return st.st_size, st.st_mtime_ns
+
+    def _load(self, f, nbytes):
+        """Return (hasher, offset) from the checkpoint if it is valid, otherwise set discarded and return None"""
+
+        try:
+            with open(self.checkpoint_path, 'rb') as cf:
+                data = json.loads(cf.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.discarded = 'unreadable checkpoint: %r' % e
+            return None
+        try:
+            return self._validate(f, nbytes, data)
+        except (KeyError, TypeError, ValueError, AssertionError) as e:
+            self.discarded = 'invalid checkpoint: %r' % e
+            return None
+
+    def _validate(self, f, nbytes, data):
+        size, mtime_ns = self._file_id(f)
+        current = {'version': FORMAT_VERSION, 'size': size, 'mtime_ns': mtime_ns, 'bitlen': self.bitlen}
+        for name, value in current.items():
+            if data[name] != value:
+                self.discarded = '%s changed from %r to %r' % (name, data[name], value)
+                return None
+        offset = data['offset']
+        samples = data['samples']
+        if not 0 <= offset < nbytes or _sample_digests(f, samples['offsets']) != samples['digests']:
+            self.discarded = 'the hashed part of the file changed'
+            return None
+        h = Sha256bit.import_state_bytes(bytes.fromhex(data['state']), backend=self._backend)
+        if h.export_state()['cnt'] != offset * 8:
+            self.discarded = 'inconsistent checkpoint'
+            return None
+        return h, offset
+
+    def _write_checkpoint(self, f, h, offset):
+        size, mtime_ns = self._file_id(f)
+        offsets = _sample_offsets(offset, self.samples)
+        data = {
+            'version': FORMAT_VERSION,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'bitlen': self.bitlen,
+            'offset': offset,
+            'state': h.export_state_bytes().hex(),
+            'samples': {'size': SAMPLE_SIZE, 'offsets': offsets, 'digests': _sample_digests(f, offsets)},
+        }
+        f.seek(offset)
+        _write_atomic(self.checkpoint_path, json.dumps(data).encode('utf-8'))
+        self.checkpoints += 1
+
+    def run(self):
+        """Hash the file from the last valid checkpoint, delete the checkpoint, return the Sha256bit"""
+
+        with open(self.path, 'rb') as f:
+            size, _ = self._file_id(f)
+            nbytes = size if self.bitlen is None else (self.bitlen + 7) // 8
+            if nbytes > size:
+                raise AssertionError('bitlen=%d, file bitlen=%d' % (self.bitlen, size * 8))
+            bitlen = nbytes * 8 if self.bitlen is None else self.bitlen
+            loaded = self._load(f, nbytes)
+            if loaded is None:
+                h, offset = Sha256bit(backend=self._backend), 0
+            else:
+                h, offset = loaded
+            self.resumed_offset = offset
+            f.seek(offset)
+
+            buf = bytearray(self._buffer_size)
+            view = memoryview(buf)
+            readinto = f.readinto
+            last_bytes = offset
+            last_time = time.monotonic()
+            while offset < nbytes:
+                n = readinto(view[: min(len(buf), nbytes - offset)])
+                if not n:
+                    raise AssertionError('%s: file truncated at %d bytes' % (self.path, offset))
+                offset += n
+                if offset == nbytes:
+                    h.update(view[:n], bitlen=bitlen - (offset - n) * 8)
+                    break
+                h.update(view[:n])
+                if (self.interval_bytes is not None and offset - last_bytes >= self.interval_bytes) or (
+                    self.interval_seconds is not None and time.monotonic() - last_time >= self.interval_seconds
+                ):
+                    self._write_checkpoint(f, h, offset)
+                    last_bytes = offset
+                    last_time = time.monotonic()
+
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+        return h
+
+
+def hash_file_resumable(path, **kwargs):
+    """Return the Sha256bit of the file at path, see ResumableFileHash for the parameters"""
+
+    return ResumableFileHash(path, **kwargs).run()
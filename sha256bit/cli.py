@@ -1,18 +1,289 @@
-import argparse
-import logging
+"""sha256bit command line tool.
+
+Hash files, stdin or hex strings, or verify checksum lists, with output
+compatible with sha256sum. A bit length can be given per input, the hash
+field of its output line is then followed by ``:bitlen``, for example:
 
-from pysatl import Utils
+    $ sha256bit --bit-length 3 --hex E0
+    8287ea50445e9ddd80b791cf413e74d152a577b8441b93fa29d88edc830f4400:3  E0
+
+Files are read into one reusable buffer. With -j N, files are hashed by N
+processes. Tracing (--log-level DEBUG or INFO) is the only feature which
+imports logging.
+"""
+
+import argparse
+import os
+import sys
 
 from sha256bit import Sha256bit
 
+PROG = 'sha256bit'
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def _parse_hex(text):
+    """Parse space separated hex digits, like pysatl.Utils.ba: odd length groups get a leading 0"""
+
+    return b''.join([bytes.fromhex(x if 0 == len(x) % 2 else '0' + x) for x in text.split()])
+
+
+def _escape(name):
+    """Return (prefix, name) escaped like sha256sum does for names with backslash or newline"""
+
+    if '\\' not in name and '\n' not in name:
+        return '', name
+    return '\\', name.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _unescape(name):
+    out = []
+    i = 0
+    while i < len(name):
+        c = name[i]
+        if c == '\\':
+            i += 1
+            if i == len(name) or name[i] not in 'n\\':
+                return None
+            c = '\n' if name[i] == 'n' else '\\'
+        out.append(c)
+        i += 1
+    return ''.join(out)
+
+
+def format_line(digest, name, bitlen=None):
+    """Return a sha256sum line, with ':bitlen' after the hash if bitlen is not None"""
+
+    prefix, name = _escape(name)
+    field = digest.hex() if bitlen is None else '%s:%d' % (digest.hex(), bitlen)
+    return '%s%s  %s' % (prefix, field, name)
+
+
+def parse_line(line):
+    """Parse a checksum line, return (digest, bitlen, name) or None if the line is invalid.
+
+    Accepts the output of sha256sum, of this tool and the BSD tag format 'SHA256 (name) = hash'.
+    """
+
+    escaped = line.startswith('\\')
+    if escaped:
+        line = line[1:]
+    if line.startswith('SHA256 (') and ') = ' in line:
+        name, field = line[len('SHA256 (') :].rsplit(') = ', 1)
+    else:
+        field, sep, name = line.partition(' ')
+        if not sep or not name or name[0] not in ' *':
+            return None
+        name = name[1:]
+    if escaped:
+        name = _unescape(name)
+    hex_digest, sep, bitlen = field.partition(':')
+    if name is None or len(hex_digest) != 64:
+        return None
+    try:
+        digest = bytes.fromhex(hex_digest)
+        bitlen = int(bitlen) if sep else None
+    except ValueError:
+        return None
+    return digest, bitlen, name
+
+
+def _hash_input(job):
+    """Return (digest, error message), job is (path or '-', bitlen, backend, buffer_size, use_mmap, tracer)"""
+
+    path, bitlen, backend, buffer_size, use_mmap, tracer = job
+    try:
+        if path == '-':
+            f = sys.stdin.buffer
+            h = Sha256bit.from_file(f, bitlen=bitlen, tracer=tracer, backend=backend, buffer_size=buffer_size)
+        else:
+            h = Sha256bit.from_file(
+                path, bitlen=bitlen, tracer=tracer, backend=backend, buffer_size=buffer_size, use_mmap=use_mmap
+            )
+    except (OSError, AssertionError) as e:
+        return None, e.strerror if isinstance(e, OSError) and e.strerror else str(e)
+    return h.digest(), None
+
+
+def _hash_inputs(jobs, n_jobs):
+    """Yield (digest, error message) for each job, in order"""
+
+    parallel = [job for job in jobs if job[0] != '-']
+    if n_jobs <= 1 or len(parallel) <= 1 or jobs[0][5] is not None:
+        for job in jobs:
+            yield _hash_input(job)
+        return
+    import concurrent.futures
+
+    # stdin is read by this process, files by the pool
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        chunksize = max(1, min(64, len(parallel) // (4 * n_jobs)))
+        results = executor.map(_hash_input, parallel, chunksize=chunksize)
+        for job in jobs:
+            yield _hash_input(job) if job[0] == '-' else next(results)
+
+
+class _Output:
+    def __init__(self):
+        self._out = sys.stdout.buffer
+        self._err = sys.stderr
+
+    def line(self, text):
+        self._out.write(os.fsencode(text) + b'\n')
+
+    def error(self, text):
+        self._out.flush()
+        print('%s: %s' % (PROG, text), file=self._err)
+
+
+def _bitlens(parser, args, n):
+    if not args.bit_length:
+        return [None] * n
+    if len(args.bit_length) == 1:
+        return args.bit_length * n
+    if len(args.bit_length) != n:
+        parser.error('%d --bit-length for %d inputs' % (len(args.bit_length), n))
+    return args.bit_length
+
+
+def _hash_main(parser, args, tracer, out):
+    status = 0
+    if args.hex is not None:
+        bitlens = _bitlens(parser, args, len(args.hex))
+        for text, bitlen in zip(args.hex, bitlens):
+            try:
+                digest = Sha256bit(_parse_hex(text), bitlen=bitlen, tracer=tracer, backend=args.backend).digest()
+            except (ValueError, AssertionError) as e:
+                out.error('%s: %s' % (text, e))
+                status = 1
+                continue
+            out.line(format_line(digest, text, bitlen))
+        return status
+
+    files = args.files or ['-']
+    bitlens = _bitlens(parser, args, len(files))
+    jobs = [(path, bitlen, args.backend, args.buffer_size, args.mmap, tracer) for path, bitlen in zip(files, bitlens)]
+    for (path, bitlen, *_), (digest, error) in zip(jobs, _hash_inputs(jobs, args.jobs)):
+        if error is not None:
+            out.error('%s: %s' % (path, error))
+            status = 1
+        else:
+            out.line(format_line(digest, path, bitlen))
+    return status
+
+
+def _read_checksums(path):
+    """Return the list of (digest, bitlen, name) of a checksum file and the number of invalid lines"""
+
+    entries = []
+    invalid = 0
+    f = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        for line in f:
+            line = os.fsdecode(line.rstrip(b'\r\n'))
+            if not line or line.startswith('#'):
+                continue
+            entry = parse_line(line)
+            if entry is None:
+                invalid += 1
+            else:
+                entries.append(entry)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+    return entries, invalid
+
+
+def _plural(n, one, many):
+    return '%d %s' % (n, one if n == 1 else many)
+
+
+def _check_main(args, tracer, out):
+    status = 0
+    for path in args.files or ['-']:
+        try:
+            entries, invalid = _read_checksums(path)
+        except OSError as e:
+            out.error('%s: %s' % (path, e.strerror))
+            status = 1
+            continue
+        if not entries:
+            out.error('%s: no properly formatted checksum lines found' % path)
+            status = 1
+            continue
+        jobs = [(name, bitlen, args.backend, args.buffer_size, args.mmap, tracer) for _, bitlen, name in entries]
+        mismatches = 0
+        unreadable = 0
+        for (expected, _, name), (digest, error) in zip(entries, _hash_inputs(jobs, args.jobs)):
+            if error is not None:
+                unreadable += 1
+                if not args.status:
+                    out.error('%s: %s' % (name, error))
+                    out.line('%s: FAILED open or read' % name)
+            elif digest != expected:
+                mismatches += 1
+                if not args.status:
+                    out.line('%s: FAILED' % name)
+            elif not args.quiet and not args.status:
+                out.line('%s: OK' % name)
+        if not args.status:
+            if invalid:
+                out.error('WARNING: %s improperly formatted' % _plural(invalid, 'line is', 'lines are'))
+            if unreadable:
+                out.error('WARNING: %s could not be read' % _plural(unreadable, 'listed file', 'listed files'))
+            if mismatches:
+                out.error('WARNING: %s did NOT match' % _plural(mismatches, 'computed checksum', 'computed checksums'))
+        if mismatches or unreadable or (args.strict and invalid):
+            status = 1
+    return status
+
+
+def main(argv=None):
+    """Entry point of the sha256bit command, return the exit status"""
+
+    parser = argparse.ArgumentParser(prog=PROG, description='Print or check SHA-256 checksums, with bit granularity')
+    parser.add_argument('files', nargs='*', metavar='FILE', help='files to hash or, with --check, checksum lists')
+    parser.add_argument('-c', '--check', action='store_true', help='verify the checksums listed in the FILEs')
+    parser.add_argument(
+        '-l',
+        '--bit-length',
+        action='append',
+        type=int,
+        help='bit length of the input, once for all inputs or once per input',
+    )
+    parser.add_argument('-x', '--hex', action='append', metavar='HEX', help='hash hex digits instead of files')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes hashing files')
+    parser.add_argument('--backend', help='compression backend, see sha256bit.backend')
+    parser.add_argument('--buffer-size', type=int, default=1 << 20, help='read buffer size in bytes')
+    parser.add_argument('--mmap', action='store_true', help='memory map the files instead of reading them')
+    parser.add_argument('--quiet', action='store_true', help="with --check, don't print OK for each verified file")
+    parser.add_argument('--status', action='store_true', help="with --check, don't print anything, status code only")
+    parser.add_argument('--strict', action='store_true', help='with --check, fail on improperly formatted lines')
+    parser.add_argument('--log-level', default='WARNING', choices=LEVELS, help='DEBUG or INFO trace the computations')
+    args = parser.parse_args(argv)
+    if args.check and (args.hex is not None or args.bit_length):
+        parser.error('--check reads the bit lengths from the checksum lists')
+
+    tracer = None
+    if args.log_level in ('DEBUG', 'INFO'):
+        import logging
+
+        from sha256bit import LoggingTracer
+
+        logging.basicConfig(format='%(message)s', level=args.log_level)
+        tracer = LoggingTracer()
+
+    out = _Output()
+    try:
+        if args.check:
+            return _check_main(args, tracer, out)
+        return _hash_main(parser, args, tracer, out)
+    except BrokenPipeError:
+        # the reader of a pipeline exited early, like head: silence the final flush of stdout
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='sha256bit.cli')
-    levels = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
-    parser.add_argument('--log-level', default='WARNING', choices=levels)
-    parser.add_argument('--bit-length', help='Bit length of message', default=None, type=int)
-    parser.add_argument('message', nargs=1, help='Message to hash', type=str)
-    args = parser.parse_args()
-    logging.basicConfig(format='%(message)s', level=args.log_level)
-    msg = Utils.ba(args.message[0])
-    digest = Sha256bit(msg, bitlen=args.bit_length).digest()
-    print(Utils.hexstr(digest))
+    sys.exit(main())
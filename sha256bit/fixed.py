@@ -0,0 +1,146 @@
+"""Fast paths for fixed length messages: 32 bytes, 64 bytes and double SHA-256.
+
+For a fixed message length the padding is constant: it is precomputed, as
+well as the full message schedule of the padding block of 64 bytes messages.
+No Sha256bit object is created.
+
+The batch variants take a flat buffer of N records and return the N digests
+concatenated. They hash all records together in NumPy uint32 lanes when NumPy
+is available, see sha256bit.batch.
+"""
+
+import operator
+import struct
+
+from sha256bit import (
+    _K,
+    Sha256bit,
+    _check_bitlen,
+    _compress,
+    _compress_kw,
+    _engines,
+    _get_engine,
+    _pad,
+    _schedule,
+    batch,
+)
+
+_pack8 = struct.Struct('!8L').pack
+_unpack8 = struct.Struct('!8L').unpack
+
+
+def _padding(length):
+    """Return the bytes appended to a message of length bytes by the padding"""
+
+    return bytes(_pad(bytearray(length % 64), length * 8))[length % 64 :]
+
+
+_PAD32 = _padding(32)
+_PAD32_WORDS = struct.unpack('!8L', _PAD32)
+_PAD64 = _padding(64)
+_PAD64_KW = list(map(operator.add, _K, _schedule(list(struct.unpack('!16L', _PAD64)))))
+
+
+def _engine(backend):
+    return _engines.get(backend) or _get_engine(backend)
+
+
+def sha256_32(data, *, backend=None):
+    """Return the digest of 32 bytes"""
+
+    if len(data) != 32:
+        raise AssertionError('len(data)=%d, expected 32' % len(data))
+    h = list(Sha256bit.H_INIT)
+    engine = _engine(backend)
+    if engine is _compress:
+        w = list(_unpack8(data))
+        w.extend(_PAD32_WORDS)
+        _compress_kw(h, map(operator.add, _K, _schedule(w)))
+    else:
+        engine(h, bytes(data) + _PAD32)
+    return _pack8(*h)
+
+
+def sha256_64(data, *, backend=None):
+    """Return the digest of 64 bytes"""
+
+    if len(data) != 64:
+        raise AssertionError('len(data)=%d, expected 64' % len(data))
+    h = list(Sha256bit.H_INIT)
+    engine = _engine(backend)
+    engine(h, data)
+    if engine is _compress:
+        _compress_kw(h, _PAD64_KW)
+    else:
+        engine(h, _PAD64)
+    return _pack8(*h)
+
+
+def sha256d(data, *, bitlen=None, backend=None):
+    """Return SHA-256(SHA-256(data)), bitlen has the same semantic as for Sha256bit"""
+
+    data = memoryview(data).cast('B')
+    bitlen = _check_bitlen(len(data), bitlen)
+    engine = _engine(backend)
+    h = list(Sha256bit.H_INIT)
+    full = (bitlen // 512) * 64
+    if full:
+        engine(h, data[:full])
+    engine(h, _pad(bytearray(data[full:]), bitlen))
+    return sha256_32(_pack8(*h), backend=backend)
+
+
+def _many(buf, record_size):
+    """Hash records of record_size bytes in NumPy lanes, return the concatenated digests"""
+
+    numpy = batch.numpy
+    data = memoryview(buf).cast('B')
+    n = len(data) // record_size
+    words = numpy.frombuffer(data, dtype='>u4').astype(numpy.uint32).reshape(n, record_size // 4)
+    tail = numpy.frombuffer(_padding(record_size), dtype='>u4').astype(numpy.uint32)
+    words = numpy.concatenate([words, numpy.broadcast_to(tail, (n, len(tail)))], axis=1).T
+    h = [numpy.full(n, x, dtype=numpy.uint32) for x in Sha256bit.H_INIT]
+    for offset in range(0, len(words), 16):
+        h = batch._compress_lanes(h, words[offset : offset + 16])
+    return numpy.stack(h, axis=1).astype('>u4').tobytes()
+
+
+def _records(buf, record_size):
+    data = memoryview(buf).cast('B')
+    if len(data) % record_size:
+        raise AssertionError('buffer size=%d, record size=%d' % (len(data), record_size))
+    return data, len(data) // record_size
+
+
+def _use_numpy(use_numpy, record_size):
+    if use_numpy is None:
+        use_numpy = batch.numpy is not None
+    return use_numpy and 0 == record_size % 4
+
+
+def sha256_32_many(buf, *, backend=None, use_numpy=None):
+    """Hash each 32 bytes record of buf, return the concatenated digests"""
+
+    data, n = _records(buf, 32)
+    if _use_numpy(use_numpy, 32):
+        return _many(data, 32)
+    return b''.join([sha256_32(data[i * 32 : i * 32 + 32], backend=backend) for i in range(n)])
+
+
+def sha256_64_many(buf, *, backend=None, use_numpy=None):
+    """Hash each 64 bytes record of buf, return the concatenated digests"""
+
+    data, n = _records(buf, 64)
+    if _use_numpy(use_numpy, 64):
+        return _many(data, 64)
+    return b''.join([sha256_64(data[i * 64 : i * 64 + 64], backend=backend) for i in range(n)])
+
+
+def sha256d_many(buf, record_size, *, backend=None, use_numpy=None):
+    """Compute sha256d of each record_size bytes record of buf, return the concatenated digests"""
+
+    data, n = _records(buf, record_size)
+    if _use_numpy(use_numpy, record_size):
+        return _many(_many(data, record_size), 32)
+    step = record_size
+    return b''.join([sha256d(data[i * step : i * step + step], backend=backend) for i in range(n)])
@@ -0,0 +1,102 @@
+"""HMAC-SHA256 (RFC 2104) and HKDF-SHA256 (RFC 5869) built on Sha256bit.
+
+Messages can have any bit length. HmacKey computes the states after the
+inner and outer key blocks once, each MAC then only compresses the message
+blocks and one outer block.
+"""
+
+from sha256bit import Sha256bit
+
+_IPAD = 0x36
+_OPAD = 0x5C
+
+
+class Hmac:
+    """Running HMAC computation, same API as Sha256bit"""
+
+    digest_size = 32
+    block_size = 64
+
+    def __init__(self, inner, outer):
+        self._inner = inner
+        self._outer = outer
+
+    def update(self, m, *, bitlen=None):
+        """Update the MAC with m, see Sha256bit.update"""
+
+        self._inner.update(m, bitlen=bitlen)
+
+    def digest(self):
+        """Return the MAC of the data passed to update() so far, update() can still be called"""
+
+        outer = self._outer.copy()
+        outer.update(self._inner.digest())
+        return outer.digest()
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+    def copy(self):
+        return Hmac(self._inner.copy(), self._outer)
+
+
+class HmacKey:
+    """HMAC-SHA256 key with cached inner and outer states"""
+
+    def __init__(self, key, *, backend=None):
+        key = bytes(key)
+        if len(key) > 64:
+            key = Sha256bit(key, backend=backend).digest()
+        key = key.ljust(64, b'\x00')
+        self._inner = Sha256bit(bytes([x ^ _IPAD for x in key]), backend=backend)
+        self._outer = Sha256bit(bytes([x ^ _OPAD for x in key]), backend=backend)
+
+    def new(self, m=None, *, bitlen=None):
+        """Return a new Hmac object, m and bitlen are passed to update()"""
+
+        o = Hmac(self._inner.copy(), self._outer)
+        o.update(m, bitlen=bitlen)
+        return o
+
+    def mac(self, m, *, bitlen=None):
+        """Return the MAC of m"""
+
+        return self.new(m, bitlen=bitlen).digest()
+
+
+def hmac_sha256(key, m, *, bitlen=None, backend=None):
+    """Return HMAC-SHA256(key, m), bitlen optionally gives the bit length of m"""
+
+    return HmacKey(key, backend=backend).mac(m, bitlen=bitlen)
+
+
+def hkdf_extract(salt, ikm, *, ikm_bitlen=None, backend=None):
+    """Return the pseudorandom key extracted from ikm, salt can be empty"""
+
+    return hmac_sha256(salt if salt else bytes(32), ikm, bitlen=ikm_bitlen, backend=backend)
+
+
+def hkdf_expand(prk, info, length, *, backend=None):
+    """Return length bytes of output keying material derived from prk and info"""
+
+    if length > 255 * 32:
+        raise AssertionError('length=%d, max is %d' % (length, 255 * 32))
+    key = HmacKey(prk, backend=backend)
+    okm = bytearray()
+    t = b''
+    i = 1
+    while len(okm) < length:
+        h = key.new(t)
+        h.update(info)
+        h.update(bytes([i]))
+        t = h.digest()
+        okm += t
+        i += 1
+    return bytes(okm[:length])
+
+
+def hkdf(ikm, length, *, salt=b'', info=b'', ikm_bitlen=None, backend=None):
+    """Return length bytes of output keying material, extract then expand"""
+
+    prk = hkdf_extract(salt, ikm, ikm_bitlen=ikm_bitlen, backend=backend)
+    return hkdf_expand(prk, info, length, backend=backend)
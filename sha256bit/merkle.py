@@ -0,0 +1,113 @@
+"""Merkle trees built on Sha256bit.
+
+A leaf hash is the digest of leaf_prefix followed by the leaf bits, leaves
+can have any bit length. An interior node hash is the digest of node_prefix
+followed by the hashes of its two children. A node without sibling is
+promoted unchanged to the upper level.
+
+Each level is stored as one bytearray of 32 bytes hashes. Updating a leaf
+only recomputes the hashes on its path to the root. With the default empty
+node_prefix, interior nodes hash exactly 64 bytes with sha256bit.fixed.sha256_64:
+the padding block is constant and its message schedule is precomputed.
+"""
+
+from sha256bit import Sha256bit
+from sha256bit.fixed import sha256_64
+
+
+class MerkleTree:
+    """Merkle tree over a list of leaves"""
+
+    def __init__(
+        self,
+        leaves,
+        *,
+        bitlens=None,
+        leaf_prefix=b'',
+        node_prefix=b'',
+        backend=None,
+        executor=None,
+        max_workers=None,
+    ):
+        """leaves is a list of buffers, bitlens optionally gives the bit length of each leaf.
+
+        Leaves are hashed with a process pool if executor or max_workers is
+        given, see sha256bit.parallel.
+        """
+
+        self.leaf_prefix = bytes(leaf_prefix)
+        self.node_prefix = bytes(node_prefix)
+        self._backend = backend
+        leaves = list(leaves)
+        if not leaves:
+            raise AssertionError('a Merkle tree needs at least one leaf')
+        bitlens = [None] * len(leaves) if bitlens is None else list(bitlens)
+        if len(bitlens) != len(leaves):
+            raise AssertionError('len(bitlens)=%d, len(leaves)=%d' % (len(bitlens), len(leaves)))
+
+        if executor is None and max_workers is None:
+            hashes = [self._leaf_hash(leaf, bitlen) for leaf, bitlen in zip(leaves, bitlens)]
+        else:
+            from sha256bit import parallel
+
+            jobs = [self._leaf_job(leaf, bitlen) for leaf, bitlen in zip(leaves, bitlens)]
+            results = parallel.hash_messages(jobs, executor=executor, max_workers=max_workers)
+            hashes = [r.digest for r in results]
+
+        self._levels = [bytearray(b''.join(hashes))]
+        while len(self._levels[-1]) > 32:
+            below = self._levels[-1]
+            n = len(below) // 32
+            level = bytearray((n + 1) // 2 * 32)
+            for i in range(0, n - 1, 2):
+                level[i * 16 : i * 16 + 32] = self._node_hash(below[i * 32 : i * 32 + 64])
+            if n % 2:
+                level[-32:] = below[-32:]
+            self._levels.append(level)
+
+    def _leaf_job(self, leaf, bitlen):
+        leaf = memoryview(leaf).cast('B')
+        if bitlen is None:
+            bitlen = len(leaf) * 8
+        return self.leaf_prefix + leaf.tobytes(), len(self.leaf_prefix) * 8 + bitlen
+
+    def _leaf_hash(self, leaf, bitlen):
+        h = Sha256bit(self.leaf_prefix, backend=self._backend)
+        h.update(leaf, bitlen=bitlen)
+        return h.digest()
+
+    def _node_hash(self, children):
+        if not self.node_prefix:
+            return sha256_64(children, backend=self._backend)
+        h = Sha256bit(self.node_prefix, backend=self._backend)
+        h.update(children)
+        return h.digest()
+
+    def __len__(self):
+        return len(self._levels[0]) // 32
+
+    def root(self):
+        """Return the root hash"""
+
+        return bytes(self._levels[-1])
+
+    def leaf_hash(self, index):
+        """Return the hash of leaf index"""
+
+        return bytes(self._levels[0][index * 32 : index * 32 + 32])
+
+    def update_leaf(self, index, leaf, *, bitlen=None):
+        """Replace leaf index and recompute the hashes on its path to the root"""
+
+        if not 0 <= index < len(self):
+            raise IndexError('leaf index %d out of range' % index)
+        self._levels[0][index * 32 : index * 32 + 32] = self._leaf_hash(leaf, bitlen)
+        for below, level in zip(self._levels, self._levels[1:]):
+            n = len(below) // 32
+            left = index & ~1
+            index //= 2
+            if left + 1 < n:
+                node = self._node_hash(below[left * 32 : left * 32 + 64])
+            else:
+                node = below[left * 32 : left * 32 + 32]
+            level[index * 32 : index * 32 + 32] = node
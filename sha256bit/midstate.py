@@ -0,0 +1,98 @@
+"""Cache of compression states after common message prefixes.
+
+Only the block aligned part of a prefix is cached: the state after it does
+not depend on what follows. The cache is a LRU bounded both in number of
+entries and in bytes (prefix bytes plus the state). A cache can be shared
+between threads.
+"""
+
+import collections
+import threading
+
+from sha256bit import Sha256bit, _engines, _get_engine
+
+_ENTRY_OVERHEAD = 32 + 8
+
+
+class MidstateCache:
+    """LRU cache mapping block aligned prefixes to the state after them"""
+
+    def __init__(self, max_entries=1024, max_bytes=1 << 24):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def register(self, prefix, *, backend=None):
+        """Compute and store the state after the block aligned part of prefix"""
+
+        self.get(prefix, backend=backend)
+
+    def get(self, prefix, *, backend=None):
+        """Return (state, aligned_length) for prefix.
+
+        state is the tuple of 8 words after the first aligned_length bytes of
+        prefix, aligned_length is the length of prefix rounded down to a
+        multiple of 64. On a miss, the state is computed with backend, see
+        sha256bit.backend.
+        """
+
+        prefix = memoryview(prefix).cast('B')
+        aligned_length = len(prefix) - len(prefix) % 64
+        if 0 == aligned_length:
+            return Sha256bit.H_INIT, 0
+        key = prefix[:aligned_length].tobytes()
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return state, aligned_length
+            self.misses += 1
+
+        # computed out of the lock, concurrent misses on the same prefix store the same state
+        compress = _engines.get(backend) or _get_engine(backend)
+        h = list(Sha256bit.H_INIT)
+        compress(h, prefix[:aligned_length])
+        state = tuple(h)
+        with self._lock:
+            if key not in self._entries:
+                self._bytes += aligned_length + _ENTRY_OVERHEAD
+            self._entries[key] = state
+            self._evict()
+        return state, aligned_length
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, _ = self._entries.popitem(last=False)
+            self._bytes -= len(key) + _ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries, statistics are kept"""
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return a dict with hits, misses, evictions, entries and bytes"""
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+default_cache = MidstateCache()
@@ -0,0 +1,123 @@
+"""Parallel hashing of many independent inputs with a process pool.
+
+Jobs are grouped in chunks, each chunk is one task for the pool. At most
+max_in_flight chunks are pending at any time, so the memory use does not
+depend on the number of jobs. Results are streamed as HashResult tuples,
+in job order or as soon as they are available.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import os
+
+from sha256bit import Sha256bit
+
+HashResult = collections.namedtuple('HashResult', ['index', 'digest', 'state'])
+HashResult.__doc__ = """Result of one job: index of the job, digest and optionally the state before finalization"""
+
+
+def _hash_file(path):
+    return Sha256bit.from_file(path)
+
+
+def _hash_message(job):
+    m, bitlen = job
+    return Sha256bit(m, bitlen=bitlen)
+
+
+def _run_chunk(fn, chunk, with_state):
+    out = []
+    for index, job in chunk:
+        h = fn(job)
+        state = h.export_state() if with_state else None
+        out.append(HashResult(index, h.digest(), state))
+    return out
+
+
+def _chunks(jobs, chunksize):
+    it = enumerate(jobs)
+    while True:
+        chunk = list(itertools.islice(it, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _imap(fn, jobs, *, executor, max_workers, chunksize, max_in_flight, ordered, with_state):
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    if max_in_flight is None:
+        max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+    pending = collections.deque() if ordered else set()
+    try:
+        for chunk in _chunks(jobs, chunksize):
+            if len(pending) >= max_in_flight:
+                yield from _wait(pending, ordered)
+            future = executor.submit(_run_chunk, fn, chunk, with_state)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+        while pending:
+            yield from _wait(pending, ordered)
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
+
+
+def _wait(pending, ordered):
+    if ordered:
+        yield from pending.popleft().result()
+        return
+    done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+        yield from future.result()
+
+
+def hash_files(
+    paths, *, executor=None, max_workers=None, chunksize=1, max_in_flight=None, ordered=True, with_state=False
+):
+    """Hash files in parallel, yield a HashResult per path.
+
+    index is the position of the path in paths. If with_state is True, state
+    is the export_state() of each file before finalization. executor can be
+    an existing concurrent.futures executor, otherwise a ProcessPoolExecutor
+    with max_workers processes is created for the duration of the iteration.
+    """
+
+    return _imap(
+        _hash_file,
+        paths,
+        executor=executor,
+        max_workers=max_workers,
+        chunksize=chunksize,
+        max_in_flight=max_in_flight,
+        ordered=ordered,
+        with_state=with_state,
+    )
+
+
+def hash_messages(
+    jobs, *, executor=None, max_workers=None, chunksize=64, max_in_flight=None, ordered=True, with_state=False
+):
+    """Hash (message, bitlen) pairs in parallel, yield a HashResult per pair.
+
+    bitlen can be None for byte aligned messages. Other parameters are the
+    same as for hash_files.
+    """
+
+    return _imap(
+        _hash_message,
+        jobs,
+        executor=executor,
+        max_workers=max_workers,
+        chunksize=chunksize,
+        max_in_flight=max_in_flight,
+        ordered=ordered,
+        with_state=with_state,
+    )
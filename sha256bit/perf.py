@@ -0,0 +1,223 @@
+"""Performance counters of Sha256bit, aggregated over the whole process.
+
+Counters (see :func:`stats`):
+
+- ``blocks``: blocks compressed, including padding blocks
+- ``updates``: update() calls, update_many() calls update() for its last fragment
+- ``bits``, ``bytes``: bits absorbed, bytes of the buffers passed to update() and update_many()
+- ``cache_copies``, ``cache_copy_bytes``: copies of message bytes into the partial block cache, not counted for
+  the fragments of update_many() but the last one
+- ``shifted_bytes``: bytes passed to update() when the message is not byte aligned, they are bit shifted
+
+When the bits hashed so far are not a multiple of 8, update_many() calls
+update() for each non empty fragment instead: ``updates``, ``cache_copies``
+and ``shifted_bytes`` count every fragment, as separate update() calls do.
+- ``pads``, ``digests``: paddings and digest() calls
+- ``exports``, ``imports``: state exports and imports, dict or bytes
+- ``compress_time``: seconds spent compressing blocks
+- ``update_time``: seconds spent in update() out of the compression: buffering and bit shifting
+- ``finalize_time``: seconds spent in digest() out of the compression: padding and output
+
+Counters are checked once per call of the counted methods: while they are
+enabled, the work of every instance is counted, whenever it was created,
+and the compression engine is wrapped with the counters for the duration
+of the call. Disabled counters cost one check per call. The
+sha256bit.batch and sha256bit.fixed fast paths are not counted.
+
+Counters are enabled by :func:`enable`, inside a :class:`Measure` block or
+by setting the SHA256BIT_PERF environment variable to 1. Each thread
+updates its own counters, :func:`stats` adds them up.
+"""
+
+import os
+import threading
+import time
+
+ENV_VAR = 'SHA256BIT_PERF'
+
+_FIELDS = (
+    'blocks',
+    'updates',
+    'bits',
+    'bytes',
+    'cache_copies',
+    'cache_copy_bytes',
+    'shifted_bytes',
+    'pads',
+    'digests',
+    'exports',
+    'imports',
+    'compress_time',
+    'update_time',
+    'finalize_time',
+)
+
+_enabled = os.environ.get(ENV_VAR) == '1'
+_local = threading.local()
+_all_counters: list = []
+_lock = threading.Lock()
+
+
+def enable():
+    """Start counting the work of all instances"""
+
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop counting"""
+
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _counters():
+    """Return the counters of the calling thread"""
+
+    try:
+        return _local.counters
+    except AttributeError:
+        counters = _local.counters = dict.fromkeys(_FIELDS, 0)
+        with _lock:
+            _all_counters.append(counters)
+        return counters
+
+
+def stats():
+    """Return a dict with the sum of the counters of all threads"""
+
+    total = dict.fromkeys(_FIELDS, 0)
+    with _lock:
+        for counters in _all_counters:
+            for name, value in counters.items():
+                total[name] += value
+    return total
+
+
+def reset_stats():
+    """Set all the counters to 0"""
+
+    with _lock:
+        for counters in _all_counters:
+            for name in _FIELDS:
+                counters[name] = 0
+
+
+class Measure:
+    """Context manager enabling the counters in a region of code.
+
+    On exit, the stats attribute holds the counters increments during the
+    region, from all threads and all instances.
+    """
+
+    def __init__(self):
+        self.stats = None
+        self._was_enabled = None
+        self._start = None
+
+    def __enter__(self):
+        self._was_enabled = _enabled
+        enable()
+        self._start = stats()
+        return self
+
+    def __exit__(self, *exc):
+        end = stats()
+        if not self._was_enabled:
+            disable()
+        self.stats = {name: end[name] - self._start[name] for name in _FIELDS}
+        return False
+
+
+def _counting_engine(engine, _perf_counter=time.perf_counter):
+    def compress(h, blocks):
+        start = _perf_counter()
+        engine(h, blocks)
+        counters = _counters()
+        counters['compress_time'] += _perf_counter() - start
+        counters['blocks'] += len(blocks) // 64
+
+    return compress
+
+
+def _count(name):
+    _counters()[name] += 1
+
+
+def _update(o, m, bitlen):
+    """Sha256bit.update of o, counted"""
+
+    counters = _counters()
+    start = time.perf_counter()
+    compress_time = counters['compress_time']
+    counter = o._counter
+    o._update(m, bitlen)
+    counters['updates'] += 1
+    counters['bits'] += o._counter - counter
+    nbytes = memoryview(m).nbytes
+    counters['bytes'] += nbytes
+    if counter % 8:
+        counters['shifted_bytes'] += nbytes
+    elapsed = time.perf_counter() - start
+    counters['update_time'] += elapsed - (counters['compress_time'] - compress_time)
+
+
+def _update_many(o, buffers, bitlen):
+    """Sha256bit.update_many of o, counted"""
+
+    counters = _counters()
+    before = dict(counters)
+    start = time.perf_counter()
+    counter = o._counter
+    nbytes = 0
+
+    def sized():
+        nonlocal nbytes
+        for b in buffers:
+            nbytes += memoryview(b).nbytes
+            yield b
+
+    o._update_many(sized(), bitlen, _counting_engine(o._compress))
+    # the last fragment went through update(), which counted it already
+    elapsed = time.perf_counter() - start
+    counters['bits'] = before['bits'] + o._counter - counter
+    counters['bytes'] = before['bytes'] + nbytes
+    compress_time = counters['compress_time'] - before['compress_time']
+    counters['update_time'] = before['update_time'] + elapsed - compress_time
+
+
+def _update_aligned(o, m, bitlen):
+    """Sha256bit._update_aligned of o, counted"""
+
+    before = o._cache_len
+    n = len(m)
+    o._absorb(m, bitlen, _counting_engine(o._compress))
+    counters = _counters()
+    fill = min(64 - before, n) if before else 0
+    if fill:
+        counters['cache_copies'] += 1
+        counters['cache_copy_bytes'] += fill
+    # same early return condition as Sha256bit._absorb
+    if before and (before + fill < 64 or (fill == n and o._counter % 8)):
+        return
+    if o._cache_len:
+        counters['cache_copies'] += 1
+        counters['cache_copy_bytes'] += o._cache_len
+
+
+def _digest(o):
+    """Sha256bit.digest of o, counted"""
+
+    counters = _counters()
+    start = time.perf_counter()
+    compress_time = counters['compress_time']
+    digest = o._finalize(_counting_engine(o._compress))
+    counters['digests'] += 1
+    elapsed = time.perf_counter() - start
+    counters['finalize_time'] += elapsed - (counters['compress_time'] - compress_time)
+    return digest
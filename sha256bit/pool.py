@@ -0,0 +1,80 @@
+"""Pool of reusable Sha256bit instances.
+
+Servers hashing many short messages can avoid allocating a new hasher,
+with its state array and partial block buffer, for each message: an
+instance released to the pool is reset() and handed out again by the next
+acquire(). The free list is a deque, its append and pop are atomic so the
+pool can be shared between threads without lock.
+"""
+
+import collections
+
+from sha256bit import Sha256bit
+
+
+class HasherPool:
+    """Thread safe pool of Sha256bit instances sharing the same tracer and backend"""
+
+    def __init__(self, max_size=64, *, tracer=None, backend=None):
+        """At most max_size released instances are kept, extra ones are left to the garbage collector"""
+
+        self.max_size = max_size
+        self._tracer = tracer
+        self._backend = backend
+        self._free = collections.deque()
+
+    def __len__(self):
+        """Number of instances ready to be acquired"""
+
+        return len(self._free)
+
+    def acquire(self, m=None, *, bitlen=None):
+        """Return a hasher from the pool, or a new one if the pool is empty, m and bitlen are passed to update()"""
+
+        try:
+            h = self._free.pop()
+        except IndexError:
+            return Sha256bit(m, bitlen=bitlen, tracer=self._tracer, backend=self._backend)
+        if m is not None:
+            h.update(m, bitlen=bitlen)
+        return h
+
+    def release(self, h):
+        """Reset h and give it back to the pool, h must come from acquire() and must not be used anymore"""
+
+        if len(self._free) < self.max_size:
+            h.reset()
+            self._free.append(h)
+
+    def hasher(self, m=None, *, bitlen=None):
+        """Context manager acquiring a hasher and releasing it on exit"""
+
+        return _Lease(self, m, bitlen)
+
+    def digest(self, m, *, bitlen=None):
+        """Return the digest of m computed with a pooled hasher"""
+
+        h = self.acquire(m, bitlen=bitlen)
+        try:
+            return h.digest()
+        finally:
+            self.release(h)
+
+
+class _Lease:
+    __slots__ = ('_bitlen', '_h', '_m', '_pool')
+
+    def __init__(self, pool, m, bitlen):
+        self._pool = pool
+        self._m = m
+        self._bitlen = bitlen
+        self._h = None
+
+    def __enter__(self):
+        self._h = self._pool.acquire(self._m, bitlen=self._bitlen)
+        return self._h
+
+    def __exit__(self, *exc):
+        self._pool.release(self._h)
+        self._h = None
+        return False
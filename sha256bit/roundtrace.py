@@ -0,0 +1,304 @@
+"""Compact binary traces of the SHA-256 compression rounds.
+
+RoundTracer is a tracer, see sha256bit.trace, recording the 'block' and
+'round' events as packed 32-bit words instead of formatted text, either in
+memory or to a file. It is meant as a golden model for hardware
+co-verification: traces of millions of blocks stay small enough to be
+written and compared, and a hardware simulation can dump the same format.
+
+A trace is a sequence of big endian 32-bit words:
+
+- header: MAGIC, VERSION
+- block record, 26 words: BLOCK_TAG, block index, the 8 state words before
+  compression, the 16 message words of the block
+- round record, 15 words: ROUND_TAG | i, k, w, s0, s1, t1, t2 and the
+  working variables a to h after round i
+
+Blocks are numbered in the order the tracer sees them, from 0. The round
+records following a block record belong to that block. Unselected blocks
+and rounds are not recorded, the block index of the recorded ones is kept.
+
+read_trace iterates over the records of a trace and diff_traces returns the
+first divergent record of two traces. From the command line:
+
+    python3 -m sha256bit.roundtrace expected.bin actual.bin
+
+prints the first divergent round and exits with status 1, or 0 if the
+traces are identical.
+"""
+
+import argparse
+import collections
+import os
+import sys
+from array import array
+from operator import itemgetter
+
+MAGIC = 0x53324254
+VERSION = 1
+BLOCK_TAG = 0x42000000
+ROUND_TAG = 0x52000000
+
+BlockRecord = collections.namedtuple('BlockRecord', ('index', 'state', 'block'))
+RoundRecord = collections.namedtuple(
+    'RoundRecord', ('block', 'i', 'k', 'w', 's0', 's1', 't1', 't2', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+)
+
+_WORD = 'I' if array('I').itemsize == 4 else 'L'
+_BLOCK_WORDS = 26
+_ROUND_WORDS = 15
+_round_values = itemgetter('k', 'w', 's0', 's1', 't1', 't2', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+
+
+def _to_big_endian(words):
+    if sys.byteorder == 'little':
+        words = array(_WORD, words)
+        words.byteswap()
+    return words
+
+
+class RoundTracer:
+    """Tracer recording blocks and rounds as packed 32-bit words"""
+
+    def __init__(self, file=None, *, blocks=None, rounds=None, buffer_words=1 << 16):
+        """Record to file, a path or a binary file object, or to the words array if file is None.
+
+        blocks and rounds select the block indexes and round numbers to
+        record, any container supporting 'in' such as a range or a set.
+        None records all of them. Records are written to the file by chunks
+        of about buffer_words words, call close() or use the tracer as a
+        context manager to write the last ones.
+        """
+
+        self.words = array(_WORD, (MAGIC, VERSION))
+        self.blocks = 0
+        self._block_filter = blocks
+        self._round_mask = None if rounds is None else [i in rounds for i in range(64)]
+        self._buffer_words = buffer_words
+        self._recording = False
+        self._file = None
+        self._owned = False
+        if file is not None:
+            if isinstance(file, (str, bytes, os.PathLike)):
+                self._file = open(file, 'wb')
+                self._owned = True
+            else:
+                self._file = file
+
+    def __call__(self, event, fields):
+        if event == 'round':
+            if self._recording and (self._round_mask is None or self._round_mask[fields['i']]):
+                words = self.words
+                words.append(ROUND_TAG | fields['i'])
+                words.extend(_round_values(fields))
+        elif event == 'block':
+            index = self.blocks
+            self.blocks += 1
+            self._recording = self._block_filter is None or index in self._block_filter
+            if self._recording:
+                words = self.words
+                if self._file is not None and len(words) >= self._buffer_words:
+                    self.flush()
+                words.append(BLOCK_TAG)
+                words.append(index)
+                words.extend(fields['state'])
+                words.extend(_block_words(fields['block']))
+
+    def flush(self):
+        """Write the recorded words to the file"""
+
+        if self._file is not None and self.words:
+            self._file.write(_to_big_endian(self.words))
+            del self.words[:]
+
+    def close(self):
+        """Write the recorded words, close the file if the tracer opened it"""
+
+        if self._file is None:
+            return
+        self.flush()
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def to_bytes(self):
+        """Return the in memory trace in the file format"""
+
+        return _to_big_endian(self.words).tobytes()
+
+
+def _block_words(block):
+    words = array(_WORD, bytes(block))
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+
+def _chunks(source, chunk_size=1 << 20):
+    """Yield arrays of native words from a path, a binary file, a bytes-like trace or an array of words"""
+
+    if isinstance(source, array):
+        yield source
+        return
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from _chunks(f, chunk_size)
+        return
+    if hasattr(source, 'read'):
+        chunk_size -= chunk_size % 4
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                return
+            while len(data) % 4:
+                more = source.read(4 - len(data) % 4)
+                if not more:
+                    raise AssertionError('trace size is not a multiple of 4 bytes')
+                data += more
+            yield _native(data)
+        return
+    data = memoryview(source).cast('B')
+    if len(data) % 4:
+        raise AssertionError('trace size is not a multiple of 4 bytes')
+    yield _native(data)
+
+
+def _native(data):
+    words = array(_WORD)
+    words.frombytes(data)
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+
+def read_trace(source):
+    """Iterate over the records of a trace, BlockRecord and RoundRecord namedtuples.
+
+    source is a path, a binary file object, the bytes of a trace or the
+    words array of a RoundTracer. Files are read by chunks.
+    """
+
+    words = array(_WORD)
+    pos = 0
+    header = True
+    block = None
+    for chunk in _chunks(source):
+        words = words[pos:]
+        words.extend(chunk)
+        pos = 0
+        if header:
+            if len(words) < 2:
+                continue
+            if words[0] != MAGIC or words[1] != VERSION:
+                raise AssertionError('not a round trace, header %08x %08x' % (words[0], words[1]))
+            pos = 2
+            header = False
+        n = len(words)
+        while pos < n:
+            tag = words[pos]
+            if ROUND_TAG <= tag < ROUND_TAG + 64:
+                if pos + _ROUND_WORDS > n:
+                    break
+                if block is None:
+                    raise AssertionError('round record before the first block record')
+                yield RoundRecord(block, tag - ROUND_TAG, *words[pos + 1 : pos + _ROUND_WORDS])
+                pos += _ROUND_WORDS
+            elif tag == BLOCK_TAG:
+                if pos + _BLOCK_WORDS > n:
+                    break
+                block = words[pos + 1]
+                yield BlockRecord(block, tuple(words[pos + 2 : pos + 10]), tuple(words[pos + 10 : pos + 26]))
+                pos += _BLOCK_WORDS
+            else:
+                raise AssertionError('invalid record tag %08x' % tag)
+    if header or pos < len(words):
+        raise AssertionError('truncated trace')
+
+
+Divergence = collections.namedtuple('Divergence', ('position', 'expected', 'actual', 'fields'))
+Divergence.__doc__ = """First divergent record of two traces.
+
+position is the index of the record, expected and actual the records, None
+past the end of a trace, fields the names of the differing fields, None if
+the records are of different kinds.
+"""
+
+
+def diff_traces(expected, actual):
+    """Return the Divergence of the first divergent record of two traces, None if they are identical"""
+
+    missing = object()
+    records = zip(_padded(read_trace(expected), missing), _padded(read_trace(actual), missing))
+    for position, (x, y) in enumerate(records):
+        if x is missing and y is missing:
+            return None
+        if x == y:
+            continue
+        x = None if x is missing else x
+        y = None if y is missing else y
+        fields = None
+        if x is not None and y is not None and type(x) is type(y):
+            fields = [name for name, a, b in zip(x._fields, x, y) if a != b]
+        return Divergence(position, x, y, fields)
+
+
+def _padded(records, missing):
+    yield from records
+    while True:
+        yield missing
+
+
+def _describe(record):
+    if record is None:
+        return 'end of trace'
+    if isinstance(record, BlockRecord):
+        return 'block %d' % record.index
+    return 'block %d round %d' % (record.block, record.i)
+
+
+def format_divergence(d):
+    """Return a human readable report of a Divergence"""
+
+    lines = ['first divergence at record %d: %s' % (d.position, _describe(d.expected))]
+    if d.fields is None:
+        lines.append('  expected: %s' % _describe(d.expected))
+        lines.append('  actual:   %s' % _describe(d.actual))
+        return '\n'.join(lines)
+    for name in d.fields:
+        expected = getattr(d.expected, name)
+        actual = getattr(d.actual, name)
+        if isinstance(expected, tuple):
+            for i, (x, y) in enumerate(zip(expected, actual)):
+                if x != y:
+                    lines.append('  %s[%d] expected 0x%08x, actual 0x%08x' % (name, i, x, y))
+        else:
+            lines.append('  %-5s expected 0x%08x, actual 0x%08x' % (name, expected, actual))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Compare two trace files, return 0 if they are identical, 1 otherwise"""
+
+    parser = argparse.ArgumentParser(description='Report the first divergent round of two sha256bit round traces')
+    parser.add_argument('expected', help='reference trace file')
+    parser.add_argument('actual', help='trace file to check')
+    args = parser.parse_args(argv)
+    d = diff_traces(args.expected, args.actual)
+    if d is None:
+        print('traces are identical')
+        return 0
+    print(format_divergence(d))
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
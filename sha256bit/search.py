@@ -0,0 +1,141 @@
+"""Search for a counter value inside a fixed message whose digest meets a target.
+
+The message is a template of bitlen bits in which a field of field_width bits
+(at most 32) starting at bit field_offset receives the candidate counter,
+most significant bit first. Work that does not depend on the counter is done
+once:
+
+- the blocks before the one holding the field are compressed once (midstate)
+- in the block holding the field, the rounds before the first varying word
+  and the message schedule words which do not depend on the field are
+  precomputed
+- the blocks after it, including padding, have a constant message schedule
+- the first digest word is checked before the digest is built
+"""
+
+import operator
+import struct
+
+from sha256bit import _F32, _K, Sha256bit, _check_bitlen, _compress, _pad, _rounds, _schedule
+
+
+def leading_zero_bits(digest):
+    """Return the number of leading zero bits of digest"""
+
+    n = len(digest) * 8
+    return n - int.from_bytes(digest, byteorder='big').bit_length()
+
+
+def _acceptors(leading_zeros, target, predicate):
+    """Return (first_word_check, digest_check)"""
+
+    word0_checks = []
+    checks = []
+    if leading_zeros is not None:
+        if leading_zeros >= 32:
+            word0_checks.append(lambda x: 0 == x)
+        else:
+            word0_checks.append(lambda x: 0 == (x >> (32 - leading_zeros)))
+        checks.append(lambda digest: leading_zero_bits(digest) >= leading_zeros)
+    if target is not None:
+        word0_checks.append(lambda x: x <= (target >> 224))
+        checks.append(lambda digest: int.from_bytes(digest, byteorder='big') < target)
+    if predicate is not None:
+        checks.append(predicate)
+    if not checks:
+        raise AssertionError('no target: give leading_zeros, target or predicate')
+
+    def word0_check(x):
+        return all(check(x) for check in word0_checks)
+
+    def check(digest):
+        return all(check(digest) for check in checks)
+
+    return word0_check, check
+
+
+def search(
+    template,
+    field_offset,
+    field_width,
+    *,
+    bitlen=None,
+    start=0,
+    stop=None,
+    leading_zeros=None,
+    target=None,
+    predicate=None,
+):
+    """Yield (counter, digest) for each counter in range(start, stop) meeting the target.
+
+    stop defaults to 2**field_width. The target is met if all the given
+    conditions are met: at least leading_zeros leading zero bits, digest
+    lower than target when read as a big endian integer, predicate(digest)
+    is True. The field must not cross a block boundary.
+    """
+
+    template = memoryview(template).cast('B')
+    bitlen = _check_bitlen(len(template), bitlen)
+    if not 0 < field_width <= 32:
+        raise AssertionError('field_width=%d' % field_width)
+    if field_offset < 0 or field_offset + field_width > bitlen:
+        raise AssertionError('field_offset=%d, field_width=%d, bitlen=%d' % (field_offset, field_width, bitlen))
+    block_index = field_offset // 512
+    if (field_offset + field_width - 1) // 512 != block_index:
+        raise AssertionError('the field must not cross a block boundary')
+    if stop is None:
+        stop = 1 << field_width
+    if not 0 <= start <= stop <= 1 << field_width:
+        raise AssertionError('start=%d, stop=%d, field_width=%d' % (start, stop, field_width))
+    word0_check, check = _acceptors(leading_zeros, target, predicate)
+
+    full = (bitlen // 512) * 64
+    padded = memoryview(template[:full].tobytes() + _pad(bytearray(template[full:]), bitlen))
+
+    midstate = list(Sha256bit.H_INIT)
+    _compress(midstate, padded[: block_index * 64])
+
+    # block holding the field
+    shift = 512 - (field_offset % 512) - field_width
+    field_mask = ((1 << field_width) - 1) << shift
+    base = int.from_bytes(padded[block_index * 64 : block_index * 64 + 64], byteorder='big') & ~field_mask
+    w_base = list(struct.unpack('!16L', base.to_bytes(64, byteorder='big')))
+    var_words = [(j, 32 * (15 - j)) for j in range(16) if (field_mask >> (32 * (15 - j))) & _F32]
+    first = var_words[0][0]
+    dep = [(field_mask >> (32 * (15 - j))) & _F32 != 0 for j in range(16)]
+    var_schedule = []
+    for i in range(16, 64):
+        dep.append(dep[i - 16] or dep[i - 15] or dep[i - 7] or dep[i - 2])
+        if dep[i]:
+            var_schedule.append(i)
+    w_const = _schedule(list(w_base))
+    early = _rounds(midstate, map(operator.add, _K[:first], w_const[:first]))
+    k_tail = _K[first:]
+
+    # following blocks, with constant message schedule
+    tails = []
+    for i in range(block_index * 64 + 64, len(padded), 64):
+        w = _schedule(list(struct.unpack('!16L', padded[i : i + 64])))
+        tails.append(list(map(operator.add, _K, w)))
+
+    for counter in range(start, stop):
+        x = counter << shift
+        w = list(w_const)
+        for j, s in var_words:
+            w[j] = w_base[j] | ((x >> s) & _F32)
+        for i in var_schedule:
+            u = w[i - 15]
+            y = w[i - 2]
+            s0 = ((u >> 7) | (u << 25)) ^ ((u >> 18) | (u << 14)) ^ (u >> 3)
+            s1 = ((y >> 17) | (y << 15)) ^ ((y >> 19) | (y << 13)) ^ (y >> 10)
+            w[i] = (w[i - 16] + s0 + w[i - 7] + s1) & _F32
+        v = _rounds(early, map(operator.add, k_tail, w[first:]))
+        chain = midstate
+        for kw in tails:
+            chain = [(p + q) & _F32 for p, q in zip(chain, v)]
+            v = _rounds(chain, kw)
+        if not word0_check((chain[0] + v[0]) & _F32):
+            continue
+        digest = struct.pack('!8L', *[(p + q) & _F32 for p, q in zip(chain, v)])
+        if check(digest):
+            yield counter, digest
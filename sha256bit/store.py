@@ -0,0 +1,117 @@
+"""Bulk storage of Sha256bit states.
+
+StateStore packs states in the format of Sha256bit.export_state_bytes into
+fixed size records of one contiguous buffer: a bytearray or a memory mapped
+file. Record i is at offset i * RECORD_SIZE, a record full of zeros is empty.
+"""
+
+import mmap
+import os
+
+from sha256bit import _STATE_HEADER, Sha256bit
+
+RECORD_SIZE = _STATE_HEADER.size + 64
+
+
+class StateStore:
+    """Array of Sha256bit states with O(1) indexed access"""
+
+    def __init__(self, buffer=None, *, count=0):
+        """buffer is any writable buffer whose size is a multiple of RECORD_SIZE.
+        If None, a bytearray of count empty records is allocated.
+        """
+
+        if buffer is None:
+            buffer = bytearray(count * RECORD_SIZE)
+        self._buffer = buffer
+        self._view = memoryview(buffer).cast('B')
+        if len(self._view) % RECORD_SIZE:
+            raise AssertionError('buffer size=%d, record size=%d' % (len(self._view), RECORD_SIZE))
+
+    @staticmethod
+    def open(path, count=None):
+        """Open a store backed by a memory mapped file.
+        If count is not None, the file is created or resized to count records.
+        """
+
+        flags = os.O_RDWR | (os.O_CREAT if count is not None else 0)
+        fd = os.open(path, flags, 0o666)
+        try:
+            if count is not None:
+                os.ftruncate(fd, count * RECORD_SIZE)
+            size = os.fstat(fd).st_size
+            if 0 == size:
+                mm = bytearray()
+            else:
+                mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        return StateStore(mm)
+
+    def __len__(self):
+        return len(self._view) // RECORD_SIZE
+
+    def _offset(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('index %d out of range' % index)
+        return index * RECORD_SIZE
+
+    def get_bytes(self, index):
+        """Return a memoryview on record index"""
+
+        offset = self._offset(index)
+        return self._view[offset : offset + RECORD_SIZE]
+
+    def is_set(self, index):
+        """Return True if record index holds a state"""
+
+        return 0 != self._view[self._offset(index)]
+
+    def __getitem__(self, index):
+        """Return a new Sha256bit instance initialized from record index"""
+
+        if not self.is_set(index):
+            raise KeyError('record %d is empty' % index)
+        return Sha256bit.import_state_bytes(self.get_bytes(index))
+
+    def __setitem__(self, index, hasher):
+        """Store the state of hasher in record index"""
+
+        data = hasher.export_state_bytes()
+        offset = self._offset(index)
+        self._view[offset : offset + len(data)] = data
+        self._view[offset + len(data) : offset + RECORD_SIZE] = bytes(RECORD_SIZE - len(data))
+
+    def __delitem__(self, index):
+        """Empty record index"""
+
+        offset = self._offset(index)
+        self._view[offset : offset + RECORD_SIZE] = bytes(RECORD_SIZE)
+
+    def append(self, hasher):
+        """Store the state of hasher in a new record, only for bytearray backed stores"""
+
+        self._view.release()
+        self._buffer += bytes(RECORD_SIZE)
+        self._view = memoryview(self._buffer).cast('B')
+        self[len(self) - 1] = hasher
+
+    def flush(self):
+        """Flush changes to the file for memory mapped stores"""
+
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.flush()
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,128 @@
+"""Tracing of Sha256bit computations.
+
+A tracer is any callable taking an event name and a dict of raw values:
+``tracer(event, fields)``. Values are passed unformatted, formatting is left
+to the tracer. Events:
+
+- ``'block'``: ``state`` (8 words before compression), ``block`` (64 bytes)
+- ``'round'``: ``i``, ``k``, ``w``, ``s0``, ``s1``, ``t1``, ``t2`` and the
+  working variables ``a`` to ``h`` after the round
+- ``'finalize'``: ``bitlen``
+- ``'pad'``: ``bitlen``, ``last_block_bitlen``, ``last_block_full_bytes_cnt``, ``padlen``, ``shift``
+- ``'digest'``: ``state`` (8 words after the last block), ``digest``
+- ``'export'`` / ``'import'``: ``bitlen``, ``state``, ``cache``
+- ``'export_digest'`` / ``'import_digest'``: ``digest``
+
+Instances created without tracer use the one set by :func:`set_tracer`.
+When no tracer is attached, the fast compression engine is used and
+tracing has no cost. sha256bit.roundtrace records the 'block' and 'round'
+events as compact binary traces.
+"""
+
+_default_tracer = None
+
+
+def set_tracer(tracer):
+    """Set the tracer used by instances created without explicit tracer, None disables tracing"""
+
+    global _default_tracer
+    _default_tracer = tracer
+
+
+def get_tracer():
+    """Return the tracer set by set_tracer"""
+
+    return _default_tracer
+
+
+def hexstr(data):
+    """Format bytes as space separated upper case hex digits, like pysatl.Utils.hexstr"""
+
+    return ' '.join(['%02X' % x for x in data])
+
+
+def _state_hexstr(state):
+    return hexstr(b''.join([x.to_bytes(4, byteorder='big') for x in state]))
+
+
+class LoggingTracer:
+    """Tracer writing to logging, same output as the former implicit verbose mode
+
+    - 'INFO' level dumps block level information
+    - 'DEBUG' level dumps all intermediate values
+    """
+
+    def __init__(self, logger=None):
+        # imported here: logging is slow to import and only needed when tracing
+        import logging
+
+        self._logger = logging.getLogger() if logger is None else logger
+        self._info_level = logging.INFO
+        self._debug_level = logging.DEBUG
+
+    def __call__(self, event, fields):
+        getattr(self, '_' + event)(fields)
+
+    def _info(self, *lines):
+        if self._logger.isEnabledFor(self._info_level):
+            for line in lines:
+                self._logger.info(line)
+
+    def _debug(self, *lines):
+        if self._logger.isEnabledFor(self._debug_level):
+            for line in lines:
+                self._logger.debug(line)
+
+    def _block(self, fields):
+        self._info('state:  ' + _state_hexstr(fields['state']), 'block:  ' + hexstr(fields['block']))
+        if self._logger.isEnabledFor(self._debug_level):
+            lines = ['current state:']
+            for name, x in zip('abcdefgh', fields['state']):
+                lines.append('  %s = 0x%08x' % (name, x))
+            self._debug(*lines)
+
+    def _round(self, fields):
+        if not self._logger.isEnabledFor(self._debug_level):
+            return
+        i = fields['i']
+        lines = [
+            'state after round %d' % (i + 1),
+            '  k[%02d] = 0x%08x' % (i, fields['k']),
+            '  w[%02d] = 0x%08x' % (i, fields['w']),
+        ]
+        for name in ('s0', 's1', 't1', 't2', 'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'):
+            lines.append('  %-5s = 0x%08x' % (name, fields[name]))
+        self._debug(*lines)
+
+    def _finalize(self, fields):
+        self._info('bitlen: %d' % fields['bitlen'])
+
+    def _pad(self, fields):
+        if not self._logger.isEnabledFor(self._debug_level):
+            return
+        names = ('bitlen', 'last_block_bitlen', 'last_block_full_bytes_cnt', 'padlen', 'shift')
+        self._debug(*['%s = %d' % (name, fields[name]) for name in names])
+
+    def _digest(self, fields):
+        self._debug('state:  ' + _state_hexstr(fields['state']))
+        self._info('digest: ' + hexstr(fields['digest']))
+
+    def _export(self, fields):
+        self._state('exporting current state:', fields)
+
+    def _import(self, fields):
+        self._state('importing current state:', fields)
+
+    def _state(self, title, fields):
+        self._info(
+            title,
+            '  bitlen = %d' % fields['bitlen'],
+            '  state:  ' + _state_hexstr(fields['state']),
+            '  cache:  ' + hexstr(fields['cache']),
+        )
+
+    def _export_digest(self, fields):
+        self._info('exporting finalized digest:', '  digest:  ' + hexstr(fields['digest']))
+
+    def _import_digest(self, fields):
+        self._info('importing finalized digest:', '  digest:  ' + hexstr(fields['digest']))
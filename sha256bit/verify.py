@@ -0,0 +1,290 @@
+"""Conformance and differential verification of Sha256bit.
+
+- parse_rsp reads NIST CAVP response files (.rsp) one vector at a time and
+  check_rsp verifies Sha256bit against them.
+- fuzz_seed runs random cases derived from a seed: a message of random bit
+  length is hashed in chunks of random bit lengths, with the state exported
+  and imported again, as a dict or as bytes, at random points. Byte aligned
+  messages are checked against hashlib, the others against a one shot
+  computation with the python backend, checked by the CAVP vectors. A
+  failing case is shrunk to a minimal one which run_case reproduces.
+- fuzz spreads seeds over a process pool. Cases depend only on the seed and
+  their index, results are the same whatever the number of processes.
+
+From the command line, for example before a deployment:
+
+    python3 -m sha256bit.verify --rsp test/SHA256ShortMsg.rsp --seeds 64 --cases 1000 -j 8
+"""
+
+import argparse
+import collections
+import hashlib
+import os
+import random
+import sys
+
+from sha256bit import Sha256bit, backend
+
+Vector = collections.namedtuple('Vector', ('bitlen', 'msg', 'md'))
+Case = collections.namedtuple('Case', ('msg', 'bitlen', 'chunks', 'splits', 'backend'))
+Case.__doc__ = """One differential test.
+
+msg is hashed as chunks of the given bit lengths, which add up to bitlen.
+splits is a tuple of (i, fmt): before chunk i, or before the digest if i is
+len(chunks), the state is exported and imported again with fmt 'dict'
+(export_state) or 'bytes' (export_state_bytes). backend is the backend name.
+"""
+Failure = collections.namedtuple('Failure', ('seed', 'index', 'original', 'case', 'error'))
+
+SPLIT_FORMATS = ('dict', 'bytes')
+
+
+def parse_rsp(source):
+    """Iterate over the Vector of a CAVP response file, source is a path or a text file object"""
+
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source) as f:
+            yield from parse_rsp(f)
+        return
+    bitlen = None
+    msg = None
+    for line in source:
+        name, sep, value = line.partition('=')
+        if not sep:
+            continue
+        name = name.strip()
+        value = value.strip()
+        if name == 'Len':
+            bitlen = int(value)
+        elif name == 'Msg':
+            # an empty message is written as 00
+            msg = bytes.fromhex(value) if bitlen else b''
+        elif name == 'MD':
+            if bitlen is None or msg is None:
+                raise AssertionError('MD without Len and Msg: %s' % line.strip())
+            yield Vector(bitlen, msg, bytes.fromhex(value))
+            bitlen = None
+            msg = None
+
+
+def check_rsp(source, *, backend=None):
+    """Verify Sha256bit against the vectors of a CAVP response file, return the number of vectors"""
+
+    n = 0
+    for v in parse_rsp(source):
+        digest = Sha256bit(v.msg, bitlen=v.bitlen, backend=backend).digest()
+        if digest != v.md:
+            raise AssertionError(
+                'bitlen=%d, msg=%s: %s, expected %s' % (v.bitlen, v.msg.hex(), digest.hex(), v.md.hex())
+            )
+        n += 1
+    return n
+
+
+def _bits(msg, start, n):
+    """Return the n bits of msg from bit start, left aligned in bytes"""
+
+    if not n:
+        return b''
+    data = msg[start // 8 : (start + n + 7) // 8]
+    shift = start % 8
+    if not shift:
+        return data
+    x = (int.from_bytes(data, 'big') << shift) & ((1 << (len(data) * 8)) - 1)
+    return x.to_bytes(len(data), 'big')[: (n + 7) // 8]
+
+
+def _expected(case):
+    if case.bitlen % 8 == 0:
+        return hashlib.sha256(case.msg).digest()
+    return Sha256bit(case.msg, bitlen=case.bitlen, backend='python').digest()
+
+
+def run_case(case):
+    """Run case, return None if it passes, otherwise a description of the error"""
+
+    if sum(case.chunks) != case.bitlen or len(case.msg) != (case.bitlen + 7) // 8:
+        raise AssertionError('inconsistent case %r' % (case,))
+    try:
+        splits = dict(case.splits)
+        h = Sha256bit(backend=case.backend)
+        pos = 0
+        for i in range(len(case.chunks) + 1):
+            fmt = splits.get(i)
+            if fmt == 'dict':
+                h = Sha256bit.import_state(h.export_state(), backend=case.backend)
+            elif fmt == 'bytes':
+                h = Sha256bit.import_state_bytes(h.export_state_bytes(), backend=case.backend)
+            if i < len(case.chunks):
+                n = case.chunks[i]
+                h.update(_bits(case.msg, pos, n), bitlen=n)
+                pos += n
+        digest = h.digest()
+        expected = _expected(case)
+    except Exception as e:
+        return repr(e)
+    if digest != expected:
+        return 'digest %s, expected %s' % (digest.hex(), expected.hex())
+    return None
+
+
+def _cut(rng, bitlen):
+    """Return a random cut point, biased towards block boundaries"""
+
+    if rng.random() < 0.5:
+        return rng.randrange(bitlen + 1)
+    boundary = rng.randrange(bitlen // 512 + 1) * 512
+    return min(bitlen, max(0, boundary + rng.randrange(-16, 17)))
+
+
+def make_case(seed, index, *, max_bitlen=4096, backends=('python',)):
+    """Return the random case number index of seed"""
+
+    rng = random.Random('%d:%d' % (seed, index))
+    bitlen = rng.randrange(max_bitlen + 1)
+    if rng.random() < 0.5:
+        bitlen -= bitlen % 8
+    nbytes = (bitlen + 7) // 8
+    msg = bytearray(rng.getrandbits(8) for _ in range(nbytes))
+    if bitlen % 8:
+        msg[-1] &= 0xFF << (8 - bitlen % 8) & 0xFF
+    cuts = sorted(_cut(rng, bitlen) for _ in range(rng.randrange(8)))
+    chunks = tuple(b - a for a, b in zip([0, *cuts], [*cuts, bitlen]))
+    splits = tuple((i, rng.choice(SPLIT_FORMATS)) for i in range(len(chunks) + 1) if rng.random() < 0.25)
+    return Case(bytes(msg), bitlen, chunks, splits, rng.choice(backends))
+
+
+def _truncate(case, bitlen):
+    """Return case restricted to its first bitlen bits"""
+
+    chunks = []
+    total = 0
+    for n in case.chunks:
+        n = min(n, bitlen - total)
+        if not n and chunks:
+            break
+        chunks.append(n)
+        total += n
+    msg = bytearray(case.msg[: (bitlen + 7) // 8])
+    if bitlen % 8:
+        msg[-1] &= 0xFF << (8 - bitlen % 8) & 0xFF
+    splits = tuple((i, fmt) for i, fmt in case.splits if i <= len(chunks))
+    return case._replace(msg=bytes(msg), bitlen=bitlen, chunks=tuple(chunks), splits=splits)
+
+
+def _candidates(case):
+    """Yield cases simpler than case, the simplest first"""
+
+    for k in range(len(case.splits)):
+        yield case._replace(splits=case.splits[:k] + case.splits[k + 1 :])
+    for i in range(len(case.chunks) - 1):
+        chunks = (*case.chunks[:i], case.chunks[i] + case.chunks[i + 1], *case.chunks[i + 2 :])
+        splits = tuple((j if j <= i else j - 1, fmt) for j, fmt in case.splits if j != i + 1)
+        yield case._replace(chunks=chunks, splits=splits)
+    step = case.bitlen // 2
+    while step:
+        yield _truncate(case, case.bitlen - step)
+        step //= 2
+    if any(case.msg):
+        yield case._replace(msg=bytes(len(case.msg)))
+        for i, x in enumerate(case.msg):
+            if x:
+                yield case._replace(msg=case.msg[:i] + b'\0' + case.msg[i + 1 :])
+    if case.backend != 'python':
+        yield case._replace(backend='python')
+
+
+def shrink(case, fails=None):
+    """Return a minimal case for which fails(case) is true, case must fail.
+
+    fails defaults to run_case returning an error. Simplifications (fewer
+    splits, fewer chunks, shorter or zeroed message) are applied greedily
+    as long as the case keeps failing.
+    """
+
+    if fails is None:
+
+        def fails(c):
+            return run_case(c) is not None
+
+    progress = True
+    while progress:
+        progress = False
+        for candidate in _candidates(case):
+            if candidate != case and fails(candidate):
+                case = candidate
+                progress = True
+                break
+    return case
+
+
+def fuzz_seed(seed, *, cases=1000, max_bitlen=4096, backends=None):
+    """Run the cases of seed, return a list of Failure with the original and the shrunk case"""
+
+    if backends is None:
+        backends = backend.available_backends()
+    failures = []
+    for index in range(cases):
+        case = make_case(seed, index, max_bitlen=max_bitlen, backends=tuple(backends))
+        if run_case(case) is not None:
+            minimal = shrink(case)
+            failures.append(Failure(seed, index, case, minimal, run_case(minimal)))
+    return failures
+
+
+def _fuzz_job(job):
+    seed, kwargs = job
+    return fuzz_seed(seed, **kwargs)
+
+
+def fuzz(seeds, *, cases=1000, max_bitlen=4096, backends=None, processes=None):
+    """Run fuzz_seed for each seed, on processes processes (one per CPU if None), return all the failures.
+
+    Failures are sorted by seed and case index.
+    """
+
+    kwargs = {'cases': cases, 'max_bitlen': max_bitlen, 'backends': backends}
+    jobs = [(seed, kwargs) for seed in seeds]
+    if processes == 1 or len(jobs) <= 1:
+        results = map(_fuzz_job, jobs)
+        return [f for failures in results for f in failures]
+    import concurrent.futures
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        return [f for failures in executor.map(_fuzz_job, jobs) for f in failures]
+
+
+def main(argv=None):
+    """Run the CAVP vectors and the fuzzer, return 0 if all pass, 1 otherwise"""
+
+    parser = argparse.ArgumentParser(description='Verify sha256bit against CAVP vectors and hashlib')
+    parser.add_argument('--rsp', action='append', default=[], metavar='FILE', help='CAVP response file to check')
+    parser.add_argument('--seeds', type=int, default=8, help='number of fuzzer seeds')
+    parser.add_argument('--first-seed', type=int, default=0, help='first fuzzer seed')
+    parser.add_argument('--cases', type=int, default=1000, help='cases per seed')
+    parser.add_argument('--max-bitlen', type=int, default=4096, help='maximum message bit length')
+    parser.add_argument('--backend', action='append', help='backend to fuzz, all available backends by default')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes, one per CPU by default')
+    args = parser.parse_args(argv)
+
+    backends = args.backend or backend.available_backends()
+    for path in args.rsp:
+        for name in backends:
+            try:
+                n = check_rsp(path, backend=name)
+            except AssertionError as e:
+                print('%s (%s): FAILED %s' % (path, name, e))
+                return 1
+            print('%s (%s): %d vectors OK' % (path, name, n))
+
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    failures = fuzz(seeds, cases=args.cases, max_bitlen=args.max_bitlen, backends=backends, processes=args.jobs)
+    for f in failures:
+        print('seed %d case %d: %s' % (f.seed, f.index, f.error))
+        print('  minimal case: %r' % (f.case,))
+    print('%d cases, %d failures' % (len(seeds) * args.cases, len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
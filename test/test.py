@@ -1,8 +1,9 @@
 import hashlib
-import re
+import random
 
 from pysatl import Utils
 
+import sha256bit
 from sha256bit import Sha256bit
 
 
@@ -56,8 +57,10 @@ def check_against_hashlib(n_seeds=3, max_length=1024 * 4):
             check_against_hashlib(seed, msg_bitlen)
 
 
-def check(msg, bitlen, sig):
+def check(msg, bitlen, sig, *, engine=None):
     m = Sha256bit()
+    if engine is not None:
+        m._compress = engine
     if isinstance(msg, str):
         msg = msg.encode('ascii')
     descr = 'msg      = ' + Utils.hexstr(msg) + '\n'
@@ -75,6 +78,149 @@ def check(msg, bitlen, sig):
     assert digest == sig, err_msg
 
 
+def check_round_trace():
+    print('check round trace')
+
+    import io
+    import os
+    import struct
+    import tempfile
+    from array import array
+
+    from sha256bit import roundtrace
+
+    events = []
+
+    def tracer(event, fields):
+        events.append((event, fields))
+
+    msg = msg_generator(b'round trace', 100 * 8 + 3)
+    expected = Sha256bit(msg, bitlen=100 * 8 + 3).digest()
+    Sha256bit(msg, bitlen=100 * 8 + 3, tracer=tracer).digest()
+
+    rec = roundtrace.RoundTracer()
+    assert expected == Sha256bit(msg, bitlen=100 * 8 + 3, tracer=rec).digest()
+    assert rec.blocks == 2
+    assert len(rec.words) == 2 + 2 * (26 + 64 * 15)
+    records = list(roundtrace.read_trace(rec.words))
+    assert records == list(roundtrace.read_trace(rec.to_bytes()))
+    traced = [fields for event, fields in events if event in ('block', 'round')]
+    assert len(records) == len(traced)
+    for record, fields in zip(records, traced):
+        if isinstance(record, roundtrace.BlockRecord):
+            assert record.state == fields['state']
+            assert record.block == struct.unpack('!16L', fields['block'])
+        else:
+            assert record._asdict() == dict(fields, block=record.block)
+    assert [r.block for r in records if isinstance(r, roundtrace.RoundRecord)] == [0] * 64 + [1] * 64
+
+    # selection of blocks and rounds, the block index is kept
+    rec = roundtrace.RoundTracer(blocks={1}, rounds=range(62, 64))
+    Sha256bit(msg, bitlen=100 * 8 + 3, tracer=rec).digest()
+    records = list(roundtrace.read_trace(rec.to_bytes()))
+    assert [type(r).__name__ for r in records] == ['BlockRecord', 'RoundRecord', 'RoundRecord']
+    assert records[0].index == 1
+    assert [(r.block, r.i) for r in records[1:]] == [(1, 62), (1, 63)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'expected.bin')
+        with roundtrace.RoundTracer(path, buffer_words=100) as rec:
+            Sha256bit(msg * 5, tracer=rec).digest()
+        data = open(path, 'rb').read()
+        mem = roundtrace.RoundTracer()
+        Sha256bit(msg * 5, tracer=mem).digest()
+        assert data == mem.to_bytes()
+        f = io.BytesIO()
+        with roundtrace.RoundTracer(f) as rec:
+            Sha256bit(msg * 5, tracer=rec).digest()
+        assert f.getvalue() == data
+        assert list(roundtrace.read_trace(path)) == list(roundtrace.read_trace(data))
+        assert roundtrace.diff_traces(path, data) is None
+
+        # first divergence, a wrong t1 in round 17 of block 3
+        words = array(mem.words.typecode, mem.words)
+        pos = 2 + 3 * (26 + 64 * 15) + 26 + 17 * 15
+        assert words[pos] == roundtrace.ROUND_TAG | 17
+        words[pos + 5] ^= 0x100
+        d = roundtrace.diff_traces(path, words)
+        assert (d.expected.block, d.expected.i, d.fields) == (3, 17, ['t1'])
+        assert d.actual.t1 == d.expected.t1 ^ 0x100
+        assert 'block 3 round 17' in roundtrace.format_divergence(d)
+
+        # truncated trace
+        d = roundtrace.diff_traces(data, data[: 4 * (2 + 26 + 10 * 15)])
+        assert (d.position, d.expected.i, d.actual, d.fields) == (11, 10, None, None)
+        for bad in (data[:-4], data[:-1], b'\0' * 8):
+            try:
+                list(roundtrace.read_trace(bad))
+            except AssertionError:
+                pass
+            else:
+                raise AssertionError('invalid trace accepted')
+
+        altered = os.path.join(tmp, 'actual.bin')
+        with open(altered, 'wb') as f:
+            f.write(data[:100] + bytes([data[100] ^ 1]) + data[101:])
+        assert roundtrace.main([path, path]) == 0
+        assert roundtrace.main([path, altered]) == 1
+
+
+def check_verify():
+    print('check verification harness')
+
+    import io
+    from pathlib import Path
+
+    from sha256bit import backend, verify
+
+    resource_path = Path(__file__).parent
+    vectors = list(verify.parse_rsp(resource_path.joinpath('SHA256ShortMsg.rsp')))
+    assert len(vectors) == 513
+    assert vectors[0] == (0, b'', hashlib.sha256().digest())
+    assert vectors[1].bitlen == 1 and vectors[1].msg == b'\0'
+    for name in backend.available_backends():
+        assert verify.check_rsp(resource_path.joinpath('SHA256ShortMsg.rsp'), backend=name) == 513
+        assert verify.check_rsp(resource_path.joinpath('SHA256LongMsg.rsp'), backend=name) == 512
+    md = hashlib.sha256(b'abc').hexdigest()
+    assert verify.check_rsp(io.StringIO('[L = 32]\n\nLen = 24\nMsg = 616263\nMD = %s\n' % md)) == 1
+    try:
+        verify.check_rsp(io.StringIO('Len = 24\nMsg = 616264\nMD = %s\n' % md))
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError('wrong digest accepted')
+
+    # cases only depend on the seed and their index
+    case = verify.make_case(3, 5, backends=('python', 'openssl'))
+    assert case == verify.make_case(3, 5, backends=('python', 'openssl'))
+    assert case != verify.make_case(3, 6, backends=('python', 'openssl'))
+    for index in range(50):
+        case = verify.make_case(1, index, max_bitlen=2000)
+        assert sum(case.chunks) == case.bitlen <= 2000
+        assert verify.run_case(case) is None
+    case = verify.Case(b'abc', 24, (3, 0, 13, 8), ((0, 'bytes'), (1, 'dict'), (4, 'bytes')), 'python')
+    assert verify.run_case(case) is None
+
+    assert verify.fuzz_seed(0, cases=100) == []
+    assert verify.fuzz(range(4), cases=25, max_bitlen=1500, processes=2) == []
+
+    # shrinking keeps the failure and removes everything else
+    def fails(c):
+        return c.bitlen >= 100 and 'bytes' in [fmt for _, fmt in c.splits]
+
+    msg = msg_generator(b'shrink', 300)
+    case = verify.Case(bytes(msg), 300, (7, 93, 100, 100), ((0, 'dict'), (2, 'bytes'), (4, 'dict')), 'openssl')
+    minimal = verify.shrink(case, fails)
+    assert minimal.bitlen == 100 and not any(minimal.msg)
+    assert [fmt for _, fmt in minimal.splits] == ['bytes']
+    assert len(minimal.chunks) <= 2 and minimal.backend == 'python'
+    assert verify.run_case(minimal) is None
+
+    assert (
+        verify.main(['--rsp', str(resource_path.joinpath('SHA256ShortMsg.rsp')), '--seeds', '2', '--cases', '10']) == 0
+    )
+
+
 def check_hardcoded_test_vectors():
     print('check few minimal hardcoded test vectors')
 
@@ -181,26 +327,1012 @@ def check_hardcoded_test_vectors():
     )
 
 
-def check_against_nist_cavp():
+def check_against_nist_cavp(*, engine=None):
     print("check against 'short' and 'long' bit oriented test vectors from NIST CAVP")
     # (https://csrc.nist.gov/CSRC/media/Projects/Cryptographic-Algorithm-Validation-Program/documents/shs/shabittestvectors.zip)
 
     from pathlib import Path
 
+    from sha256bit import verify
+
     resource_path = Path(__file__).parent
     for tv_file in ['SHA256ShortMsg.rsp', 'SHA256LongMsg.rsp']:
-        tv_path = resource_path.joinpath(tv_file)
-        with open(tv_path) as f:
-            for line in f:
-                if line.startswith('Len'):
-                    bitlen = int(re.search(r'Len = (.+)', line).group(1))
-                if line.startswith('Msg'):
-                    msg = Utils.ba(re.search(r'Msg = (.+)', line).group(1))
-                    if bitlen == 0:
-                        msg = bytes(0)
-                if line.startswith('MD'):
-                    md = re.search(r'MD = (.+)', line).group(1)
-                    check(msg, bitlen, md)
+        for v in verify.parse_rsp(resource_path.joinpath(tv_file)):
+            check(v.msg, v.bitlen, v.md.hex(), engine=engine)
+
+
+def check_engines(n_blocks=256):
+    print('check fast engine against traced engine')
+
+    rng = random.Random(0)
+    traced = Sha256bit(tracer=sha256bit.LoggingTracer())._compress_traced
+    for _ in range(n_blocks):
+        state = [rng.getrandbits(32) for _ in range(8)]
+        block = bytes(rng.getrandbits(8) for _ in range(64))
+        h1 = list(state)
+        h2 = list(state)
+        traced(h1, block)
+        sha256bit._compress(h2, block)
+        assert h1 == h2
+
+    check_against_nist_cavp(engine=sha256bit._compress)
+    check_against_nist_cavp(engine=traced)
+
+
+def check_backends():
+    print('check compression backends')
+
+    import pickle
+
+    from sha256bit import backend
+
+    names = backend.available_backends()
+    assert 'python' in names
+    for name in names:
+        engine = backend.get_engine(name)
+        msg = msg_generator(bytes(1), 1000 * 8)
+        assert Sha256bit(msg, backend=name).digest() == hashlib.sha256(msg).digest()
+        state = Sha256bit(msg[:100], backend=name).export_state()
+        dut = Sha256bit.import_state(state, backend=name)
+        dut.update(msg[100:])
+        assert dut.digest() == hashlib.sha256(msg).digest()
+        check_against_nist_cavp(engine=engine)
+        # runs of blocks in one call, read only buffers are copied by chunks
+        big = bytes(msg * 300)
+        h = list(Sha256bit.H_INIT)
+        engine(h, big[: len(big) - len(big) % 64])
+        expected = list(Sha256bit.H_INIT)
+        for i in range(0, len(big) - len(big) % 64, 64):
+            engine(expected, big[i : i + 64])
+        assert h == expected
+        assert Sha256bit(memoryview(big), backend=name).digest() == hashlib.sha256(big).digest()
+        assert Sha256bit(bytearray(big), backend=name).digest() == hashlib.sha256(big).digest()
+        # picklable, with any protocol
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            dut = pickle.loads(pickle.dumps(Sha256bit(msg[:100], backend=name), protocol))  # noqa: S301
+            dut.update(msg[100:])
+            assert dut.digest() == hashlib.sha256(msg).digest()
+    try:
+        Sha256bit(backend='nope')
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError('unknown backend must be rejected')
+
+
+def check_buffers():
+    print('check buffer protocol inputs')
+
+    import array
+    import mmap
+
+    msg = msg_generator(b'buffers', 1000 * 8)
+    expected = hashlib.sha256(msg).digest()
+    for m in [bytes(msg), msg, memoryview(msg), array.array('I', msg)]:
+        assert expected == Sha256bit(m).digest()
+    mm = mmap.mmap(-1, len(msg))
+    mm.write(msg)
+    assert expected == Sha256bit(mm).digest()
+    mm.close()
+    rng = random.Random(0)
+    for _ in range(8):
+        dut = Sha256bit()
+        p = 0
+        while p < len(msg):
+            n = rng.randrange(0, 200)
+            dut.update(memoryview(msg)[p : p + n])
+            p += n
+        assert expected == dut.digest()
+
+
+def check_tracer():
+    print('check tracer')
+
+    import logging
+
+    events = []
+
+    def tracer(event, fields):
+        events.append((event, fields))
+
+    msg = msg_generator(b'tracer', 100 * 8 + 3)
+    expected = Sha256bit(msg, bitlen=100 * 8 + 3).digest()
+    assert expected == Sha256bit(msg, bitlen=100 * 8 + 3, tracer=tracer).digest()
+    rounds = [fields for event, fields in events if event == 'round']
+    assert len(rounds) == 2 * 64
+    assert [fields['i'] for fields in rounds[:64]] == list(range(64))
+    assert events[-1][0] == 'digest'
+    assert events[-1][1]['digest'] == expected
+
+    sha256bit.set_tracer(tracer)
+    try:
+        events.clear()
+        assert expected == Sha256bit(msg, bitlen=100 * 8 + 3).digest()
+        assert len(events) == len(rounds) + 5
+    finally:
+        sha256bit.set_tracer(None)
+    events.clear()
+    Sha256bit(msg).digest()
+    assert not events
+
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.lines = []
+
+        def emit(self, record):
+            self.lines.append(record.getMessage())
+
+    handler = ListHandler()
+    logger = logging.getLogger('sha256bit.test')
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    state = Sha256bit(b'a', tracer=sha256bit.LoggingTracer(logger)).export_state()
+    h = Sha256bit.import_state(state, tracer=sha256bit.LoggingTracer(logger))
+    h.update(b'bc')
+    assert h.hexdigest() == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
+    assert handler.lines == [
+        'exporting current state:',
+        '  bitlen = 8',
+        '  state:  6A 09 E6 67 BB 67 AE 85 3C 6E F3 72 A5 4F F5 3A 51 0E 52 7F 9B 05 68 8C 1F 83 D9 AB 5B E0 CD 19',
+        '  cache:  61',
+        'importing current state:',
+        '  bitlen = 8',
+        '  state:  6A 09 E6 67 BB 67 AE 85 3C 6E F3 72 A5 4F F5 3A 51 0E 52 7F 9B 05 68 8C 1F 83 D9 AB 5B E0 CD 19',
+        '  cache:  61',
+        'bitlen: 24',
+        'state:  6A 09 E6 67 BB 67 AE 85 3C 6E F3 72 A5 4F F5 3A 51 0E 52 7F 9B 05 68 8C 1F 83 D9 AB 5B E0 CD 19',
+        'block:  61 62 63 80' + ' 00' * 59 + ' 18',
+        'digest: BA 78 16 BF 8F 01 CF EA 41 41 40 DE 5D AE 22 23 B0 03 61 A3 96 17 7A 9C B4 10 FF 61 F2 00 15 AD',
+    ]
+    handler.lines.clear()
+    logger.setLevel(logging.DEBUG)
+    Sha256bit(b'abc', tracer=sha256bit.LoggingTracer(logger)).digest()
+    assert len(handler.lines) == 1 + 5 + 2 + 9 + 64 * 15 + 2
+    assert 'state after round 64' in handler.lines
+    logger.removeHandler(handler)
+
+
+def check_hash_many(n_msgs=300):
+    print('check hash_many')
+
+    from sha256bit import batch
+
+    rng = random.Random(0)
+    bitlens = [rng.randrange(0, 1200) for _ in range(n_msgs)] + [0, 447, 448, 511, 512, 513]
+    messages = [msg_generator(bytes([i & 0xFF]), bitlen)[: (bitlen + 7) // 8] for i, bitlen in enumerate(bitlens)]
+    expected = [Sha256bit(m, bitlen=bitlen).digest() for m, bitlen in zip(messages, bitlens)]
+    assert expected == Sha256bit.hash_many(messages, bitlens)
+    assert expected == batch.hash_many(messages, bitlens, use_numpy=False)
+    if batch.numpy is not None:
+        assert expected == batch.hash_many(messages, bitlens, use_numpy=True)
+    messages = [bytes(m) for m in messages if len(m) % 64 != 0][:20]
+    assert [hashlib.sha256(m).digest() for m in messages] == Sha256bit.hash_many(messages)
+
+
+def check_parallel():
+    print('check parallel hashing')
+
+    import os
+    import tempfile
+
+    from sha256bit import parallel
+
+    bitlens = list(range(0, 2000, 37))
+    jobs = [(msg_generator(bytes([i]), bitlen)[: (bitlen + 7) // 8], bitlen) for i, bitlen in enumerate(bitlens)]
+    expected = [Sha256bit(m, bitlen=bitlen).digest() for m, bitlen in jobs]
+    results = list(parallel.hash_messages(jobs, max_workers=2, chunksize=5, max_in_flight=2))
+    assert [r.index for r in results] == list(range(len(jobs)))
+    assert [r.digest for r in results] == expected
+    results = parallel.hash_messages(iter(jobs), max_workers=2, chunksize=3, ordered=False, with_state=True)
+    results = sorted(results)
+    assert [r.digest for r in results] == expected
+    assert [Sha256bit.import_state(r.state).digest() for r in results] == expected
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, size in enumerate([0, 1, 64, 1000, 70000]):
+            path = os.path.join(tmp, '%d.bin' % i)
+            with open(path, 'wb') as f:
+                f.write(msg_generator(bytes([i]), size * 8)[:size])
+            paths.append(path)
+        results = list(parallel.hash_files(paths, max_workers=2))
+        for path, r in zip(paths, results):
+            with open(path, 'rb') as f:
+                assert r.digest == hashlib.sha256(f.read()).digest()
+
+
+def check_files():
+    print('check file hashing')
+
+    import io
+    import os
+    import tempfile
+
+    msg = msg_generator(b'file', 5000 * 8)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'msg.bin')
+        with open(path, 'wb') as f:
+            f.write(msg)
+        for bitlen in [None, 0, 1, 7, 8, 511, 512, 513, 4096 + 5, 5000 * 8 - 1, 5000 * 8]:
+            nbytes = len(msg) if bitlen is None else (bitlen + 7) // 8
+            expected = Sha256bit(msg[:nbytes], bitlen=bitlen).digest()
+            for use_mmap in [False, True]:
+                for buffer_size in [1, 100, 1 << 16]:
+                    h = Sha256bit.from_file(path, bitlen=bitlen, buffer_size=buffer_size, use_mmap=use_mmap)
+                    assert expected == h.digest()
+            with open(path, 'rb') as f:
+                h = Sha256bit(b'abc')
+                h.update_from_file(f, bitlen=bitlen)
+                assert f.tell() == nbytes
+            prefixed_bitlen = 24 + (nbytes * 8 if bitlen is None else bitlen)
+            assert h.digest() == Sha256bit(b'abc' + msg[:nbytes], bitlen=prefixed_bitlen).digest()
+        expected = hashlib.sha256(msg).digest()
+        assert expected == Sha256bit.from_file(io.BytesIO(msg), buffer_size=64).digest()
+        try:
+            Sha256bit.from_file(path, bitlen=len(msg) * 8 + 1)
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError('reading more bits than available must fail')
+
+
+def check_midstate_cache():
+    print('check midstate cache')
+
+    import threading
+
+    from sha256bit import backend
+    from sha256bit.midstate import MidstateCache
+
+    cache = MidstateCache(max_entries=3, max_bytes=64 * 10)
+    prefixes = [msg_generator(bytes([i]), (64 * i + 10) * 8) for i in range(5)]
+    suffix = b'suffix'
+    for _ in range(2):
+        for prefix in prefixes[:3]:
+            h = Sha256bit.with_prefix(prefix, cache=cache)
+            h.update(suffix)
+            assert h.digest() == hashlib.sha256(prefix + suffix).digest()
+    # prefix 0 has no full block, it is never cached
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'evictions': 0, 'entries': 2, 'bytes': 64 * 3 + 2 * 40}
+    for prefix in prefixes[3:]:
+        assert Sha256bit.with_prefix(prefix, cache=cache).digest() == hashlib.sha256(prefix).digest()
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['bytes'] <= 64 * 10
+    assert stats['evictions'] == 2
+    assert Sha256bit.with_prefix(prefixes[2]).digest() == hashlib.sha256(prefixes[2]).digest()
+
+    # misses are computed with the backend of the hasher
+    prefix = msg_generator(b'backend', 64 * 8 * 20)
+    for name in backend.available_backends():
+        cache = MidstateCache()
+        assert Sha256bit.with_prefix(prefix, cache=cache, backend=name).digest() == hashlib.sha256(prefix).digest()
+        assert cache.stats()['misses'] == 1
+
+    # shared between threads
+    cache = MidstateCache(max_entries=4)
+    prefixes = [msg_generator(bytes([i]), 64 * 8 * 2) for i in range(8)]
+
+    results = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(200):
+            prefix = rng.choice(prefixes)
+            results.append(Sha256bit.with_prefix(prefix, cache=cache).digest() == hashlib.sha256(prefix).digest())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [True] * 800
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == 800
+    assert stats['entries'] == 4
+    assert stats['bytes'] == 4 * (128 + 40)
+
+
+def check_copy():
+    print('check copy and non destructive digest')
+
+    msg = msg_generator(b'copy', 300 * 8)
+    h = Sha256bit()
+    for i in range(0, len(msg), 50):
+        h.update(msg[i : i + 50])
+        assert h.digest() == hashlib.sha256(msg[: i + 50]).digest()
+        assert h.digest() == h.digest()
+    prefix = Sha256bit(msg[:100])
+    for n in [0, 1, 63, 64, 200]:
+        fork = prefix.copy()
+        fork.update(msg[100 : 100 + n])
+        assert fork.digest() == hashlib.sha256(msg[: 100 + n]).digest()
+    assert prefix.digest() == hashlib.sha256(msg[:100]).digest()
+    h = Sha256bit(msg[:10], bitlen=75).copy()
+    assert h.hexdigest() == Sha256bit(msg[:10], bitlen=75).hexdigest()
+    # imported states do not share their words with the exported ones
+    state = prefix.export_state()
+    dut = Sha256bit.import_state(state)
+    dut.update(msg[100:])
+    assert state['h'] == prefix.export_state()['h']
+    assert dut.digest() == hashlib.sha256(msg).digest()
+
+
+def check_state_bytes():
+    print('check binary state format and state store')
+
+    import os
+    import tempfile
+
+    from sha256bit.store import RECORD_SIZE, StateStore
+
+    msg = msg_generator(b'state', 200 * 8)
+    bitlens = [0, 1, 8, 447, 504, 511, 512, 513, 1000, 1023, 1024, 1600]
+    hashers = [Sha256bit(msg[: (bitlen + 7) // 8], bitlen=bitlen) for bitlen in bitlens]
+    for h in hashers:
+        data = h.export_state_bytes()
+        assert len(data) <= RECORD_SIZE
+        dut = Sha256bit.import_state_bytes(data + b'\x00' * 3)
+        assert dut.export_state() == h.export_state()
+        assert dut.digest() == h.digest()
+    finalized = Sha256bit.import_state({'h': hashers[3].digest(), 'cnt': 447, 'cache': None})
+    dut = Sha256bit.import_state_bytes(finalized.export_state_bytes())
+    assert dut.digest() == hashers[3].digest()
+
+    store = StateStore(count=2)
+    store[1] = hashers[1]
+    assert not store.is_set(0)
+    for h in hashers:
+        store.append(h)
+    assert len(store) == 2 + len(hashers)
+    assert [store[i].digest() for i in range(2, len(store))] == [h.digest() for h in hashers]
+    del store[-1]
+    assert not store.is_set(len(store) - 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'states.bin')
+        with StateStore.open(path, len(hashers)) as store:
+            for i, h in enumerate(hashers):
+                store[i] = h
+        assert os.path.getsize(path) == len(hashers) * RECORD_SIZE
+        with StateStore.open(path) as store:
+            assert [store[i].digest() for i in range(len(store))] == [h.digest() for h in hashers]
+
+
+def check_search():
+    print('check counter search')
+
+    from sha256bit.search import leading_zero_bits, search
+
+    def with_counter(template, field_offset, field_width, counter):
+        x = int.from_bytes(template, byteorder='big')
+        shift = len(template) * 8 - field_offset - field_width
+        x &= ~(((1 << field_width) - 1) << shift)
+        x |= counter << shift
+        return x.to_bytes(len(template), byteorder='big')
+
+    template = msg_generator(b'search', 150 * 8)
+    for bitlen, field_offset, field_width in [(1200, 520, 32), (1197, 600, 13), (443, 410, 32), (100, 3, 5)]:
+        template_bytes = template[: (bitlen + 7) // 8]
+        results = list(search(template_bytes, field_offset, field_width, bitlen=bitlen, stop=20, predicate=bool))
+        assert [counter for counter, _ in results] == list(range(20))
+        for counter, digest in results:
+            m = with_counter(template_bytes, field_offset, field_width, counter)
+            assert digest == Sha256bit(m, bitlen=bitlen).digest()
+
+    counter, digest = next(search(template, 800, 32, leading_zeros=9))
+    assert leading_zero_bits(digest) >= 9
+    assert digest == Sha256bit(with_counter(template, 800, 32, counter)).digest()
+    assert not list(search(template, 800, 32, stop=counter, leading_zeros=9))
+    target = int.from_bytes(digest, byteorder='big') + 1
+    assert next(search(template, 800, 32, target=target)) == (counter, digest)
+
+    # the counters must fit in the field
+    assert [c for c, _ in search(bytes(8), 8, 4, start=14, predicate=bool)] == [14, 15]
+    for start, stop in [(0, 17), (-1, 4), (5, 4), (16, 32)]:
+        try:
+            list(search(bytes(8), 8, 4, start=start, stop=stop, predicate=bool))
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError('start=%d, stop=%d accepted' % (start, stop))
+
+
+def check_bit_stream(n_trials=200):
+    print('check bit granular updates at any position')
+
+    rng = random.Random(0)
+
+    def to_bytes(value, bitlen):
+        # left aligned, with garbage in the unused bits of the last byte
+        pad = (-bitlen) % 8
+        out = ((value << pad) | ((1 << pad) - 1)).to_bytes((bitlen + 7) // 8, byteorder='big')
+        return out
+
+    for _ in range(n_trials):
+        total = rng.randrange(0, 3000)
+        x = rng.getrandbits(total) if total else 0
+        expected = Sha256bit(to_bytes(x, total), bitlen=total).digest()
+        dut = Sha256bit()
+        p = 0
+        while p < total:
+            n = rng.randrange(1, min(700, total - p) + 1)
+            dut.update(to_bytes((x >> (total - p - n)) & ((1 << n) - 1), n), bitlen=n)
+            p += n
+            if rng.randrange(4) == 0:
+                dut = Sha256bit.import_state(dut.export_state())
+            if rng.randrange(4) == 0:
+                dut = Sha256bit.import_state_bytes(dut.export_state_bytes())
+        assert expected == dut.digest()
+    # a long unaligned stream
+    msg = msg_generator(b'stream', 20000 * 8)
+    dut = Sha256bit(b'\x80', bitlen=1)
+    dut.update(msg)
+    dut.update(b'\x00', bitlen=7)
+    expected = ((((1 << (len(msg) * 8)) | int.from_bytes(msg, byteorder='big'))) << 7).to_bytes(len(msg) + 1, 'big')
+    assert dut.digest() == hashlib.sha256(expected).digest()
+
+
+def check_digest_at():
+    print('check digests at several offsets')
+
+    msg = msg_generator(b'offsets', 700 * 8)
+    offsets = [0, 0, 1, 7, 8, 9, 511, 512, 513, 1000, 2047, 4096, 4099, 700 * 8 - 1, 700 * 8]
+    dut = Sha256bit()
+    results = list(dut.digest_at(msg, offsets))
+    assert [offset for offset, _ in results] == offsets
+    for offset, digest in results:
+        assert digest == Sha256bit(msg[: (offset + 7) // 8], bitlen=offset).digest()
+    assert dut.digest() == hashlib.sha256(msg).digest()
+
+    dut = Sha256bit(b'\xff', bitlen=3)
+    results = list(dut.digest_at(msg[:10], [3, 10, 50], bitlen=75))
+    for offset, digest in results:
+        ref = Sha256bit(b'\xff', bitlen=3)
+        ref.update(msg[: (offset - 3 + 7) // 8], bitlen=offset - 3)
+        assert digest == ref.digest()
+    ref = Sha256bit(b'\xff', bitlen=3)
+    ref.update(msg[:10], bitlen=75)
+    assert dut.digest() == ref.digest()
+
+
+def check_merkle():
+    print('check Merkle trees')
+
+    from sha256bit.merkle import MerkleTree
+
+    def reference_root(hashes, node_prefix):
+        while len(hashes) > 1:
+            level = []
+            for i in range(0, len(hashes) - 1, 2):
+                level.append(hashlib.sha256(node_prefix + hashes[i] + hashes[i + 1]).digest())
+            if len(hashes) % 2:
+                level.append(hashes[-1])
+            hashes = level
+        return hashes[0]
+
+    leaves = [msg_generator(bytes([i]), 8 * i)[:i] for i in range(13)]
+    for n in [1, 2, 3, 7, 8, 13]:
+        for leaf_prefix, node_prefix in [(b'', b''), (b'\x00', b'\x01')]:
+            tree = MerkleTree(leaves[:n], leaf_prefix=leaf_prefix, node_prefix=node_prefix)
+            hashes = [hashlib.sha256(leaf_prefix + leaf).digest() for leaf in leaves[:n]]
+            assert tree.root() == reference_root(hashes, node_prefix)
+            for i in [0, n // 2, n - 1]:
+                tree.update_leaf(i, b'changed')
+                hashes[i] = hashlib.sha256(leaf_prefix + b'changed').digest()
+                assert tree.leaf_hash(i) == hashes[i]
+                assert tree.root() == reference_root(hashes, node_prefix)
+
+    bitlens = [i * 8 - (i % 8) for i in range(1, 13)]
+    leaves = [msg_generator(bytes([i]), 8 * i)[:i] for i in range(1, 13)]
+    tree = MerkleTree(leaves, bitlens=bitlens, leaf_prefix=b'\x00', backend='python')
+    parallel_tree = MerkleTree(leaves, bitlens=bitlens, leaf_prefix=b'\x00', max_workers=2)
+    hashes = []
+    for leaf, bitlen in zip(leaves, bitlens):
+        h = Sha256bit(b'\x00')
+        h.update(leaf, bitlen=bitlen)
+        hashes.append(h.digest())
+    assert tree.root() == parallel_tree.root() == reference_root(hashes, b'')
+
+
+def check_fixed_length():
+    print('check fixed length fast paths')
+
+    from sha256bit import backend, fixed
+
+    def sha256(data):
+        return hashlib.sha256(data).digest()
+
+    records = msg_generator(b'fixed', 64 * 20 * 8)
+    for name in backend.available_backends():
+        for i in range(0, len(records), 64):
+            data = records[i : i + 64]
+            assert fixed.sha256_64(data, backend=name) == sha256(data)
+            assert fixed.sha256_32(data[:32], backend=name) == sha256(data[:32])
+            assert fixed.sha256d(data[: i // 16], backend=name) == sha256(sha256(data[: i // 16]))
+    assert fixed.sha256d(b'\x00', bitlen=1) == sha256(Sha256bit(b'\x00', bitlen=1).digest())
+    long_msg = msg_generator(b'long', 300 * 8)
+    assert fixed.sha256d(long_msg) == sha256(sha256(long_msg))
+
+    for use_numpy in [False, True]:
+        expected = b''.join([sha256(records[i : i + 32]) for i in range(0, len(records), 32)])
+        assert fixed.sha256_32_many(records, use_numpy=use_numpy) == expected
+        expected = b''.join([sha256(records[i : i + 64]) for i in range(0, len(records), 64)])
+        assert fixed.sha256_64_many(records, use_numpy=use_numpy) == expected
+        for size in [10, 80, 128]:
+            data = records[: size * 9]
+            expected = b''.join([sha256(sha256(data[i : i + size])) for i in range(0, len(data), size)])
+            assert fixed.sha256d_many(data, size, use_numpy=use_numpy) == expected
+        if fixed.batch.numpy is None:
+            break
+
+
+def check_hmac():
+    print('check HMAC and HKDF')
+
+    import hmac
+
+    from sha256bit import hmac as hmac256
+
+    msg = msg_generator(b'hmac', 200 * 8)
+    for key_len in [0, 1, 32, 64, 65, 131]:
+        key = msg[:key_len]
+        hmac_key = hmac256.HmacKey(key)
+        for n in [0, 1, 55, 56, 64, 119, 200]:
+            expected = hmac.new(key, msg[:n], 'sha256').digest()
+            assert hmac256.hmac_sha256(key, msg[:n]) == expected
+            assert hmac_key.mac(msg[:n]) == expected
+        h = hmac_key.new(msg[:10])
+        fork = h.copy()
+        h.update(msg[10:])
+        assert h.digest() == hmac.new(key, msg, 'sha256').digest()
+        assert fork.hexdigest() == hmac.new(key, msg[:10], 'sha256').hexdigest()
+
+    # bit granular message: H(K ^ opad || H(K ^ ipad || m))
+    key = msg[:20].ljust(64, b'\x00')
+    inner = Sha256bit(bytes([x ^ 0x36 for x in key]))
+    inner.update(msg[:13], bitlen=101)
+    outer = Sha256bit(bytes([x ^ 0x5C for x in key]) + inner.digest())
+    assert hmac256.hmac_sha256(msg[:20], msg[:13], bitlen=101) == outer.digest()
+
+    # RFC 5869 test cases 1 and 3
+    okm = hmac256.hkdf(bytes([0x0B] * 22), 42, salt=bytes(range(13)), info=bytes(range(0xF0, 0xFA)))
+    assert okm.hex() == ('3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf34007208d5b887185865')
+    okm = hmac256.hkdf(bytes([0x0B] * 22), 42)
+    assert okm.hex() == ('8da4e775a563c18f715f802a063c5a31b8a11f5c5ee1879ec3454e5f3c738d2d9d201395faa4b61a96c8')
+
+
+def check_aio():
+    print('check asyncio integration')
+
+    import asyncio
+
+    from sha256bit import aio
+
+    def sha(data):
+        return hashlib.sha256(data).digest()
+
+    msg = msg_generator(b'aio', 5000 * 8)
+
+    async def chunks(data, size):
+        for i in range(0, len(data), size):
+            await asyncio.sleep(0)
+            yield data[i : i + size]
+
+    async def run():
+        h = aio.AsyncSha256bit(msg[:3], bitlen=20, offload_size=1000)
+        await h.update(msg[:100])
+        await h.update(msg[:2000])
+        expected = Sha256bit(msg[:3], bitlen=20)
+        expected.update(msg[:100])
+        expected.update(msg[:2000])
+        assert h.digest() == expected.digest()
+
+        for chunk_size in [1, 100, 4096]:
+            for batch_size in [64, 1000, 1 << 20]:
+                reader = asyncio.StreamReader()
+                reader.feed_data(msg)
+                reader.feed_eof()
+                assert await aio.hash_stream(reader, chunk_size=chunk_size, batch_size=batch_size) == sha(msg)
+
+        # checkpoints restart the hash of the rest of the stream
+        checkpoints = []
+        h = aio.AsyncSha256bit(msg[:5], offload_size=100)
+        n = await h.update_from_stream(
+            chunks(msg, 300), batch_size=1000, on_checkpoint=lambda n, state: checkpoints.append((n, state))
+        )
+        assert n == len(msg)
+        assert h.digest() == sha(msg[:5] + msg)
+        assert [x for x, _ in checkpoints] == [1147, 2363, 3579, 4795, 5000]
+        for n, state in checkpoints:
+            assert 0 == (5 + n) % 64 or n == len(msg)
+            restored = aio.AsyncSha256bit.from_hasher(Sha256bit.import_state(state))
+            await restored.update_from_stream(chunks(msg[n:], 7))
+            assert restored.digest() == h.digest()
+        assert h.export_state() == await h.checkpoint()
+
+        # the event loop keeps running while a large update is hashed
+        ticks = 0
+        done = False
+
+        async def ticker():
+            nonlocal ticks
+            while not done:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        h = aio.AsyncSha256bit(backend='python', offload_size=1000)
+        task = asyncio.ensure_future(ticker())
+        await h.update(msg * 10)
+        done = True
+        await task
+        assert ticks > 1
+        assert h.digest() == sha(msg * 10)
+
+    asyncio.run(run())
+
+
+def check_perf():
+    print('check performance counters')
+
+    import threading
+
+    from sha256bit import perf
+
+    msg = msg_generator(b'perf', 200 * 8)
+    assert not perf.is_enabled()
+    with perf.Measure() as m:
+        h = Sha256bit(msg[:3])
+        h.update(msg[:100])
+        assert h.digest() == hashlib.sha256(msg[:3] + msg[:100]).digest()
+        h2 = Sha256bit.import_state(h.export_state())
+        Sha256bit.import_state_bytes(h2.copy().export_state_bytes())
+        h3 = Sha256bit(b'\x80', bitlen=1)
+        h3.update(msg[:10])
+    assert not perf.is_enabled()
+    expected = {
+        'blocks': 2,
+        'updates': 4,
+        'bits': 103 * 8 + 1 + 80,
+        'bytes': 114,
+        'cache_copies': 3 + 3,
+        'cache_copy_bytes': 103 + 1 + 10 + 1,
+        'shifted_bytes': 10,
+        'pads': 1,
+        'digests': 1,
+        'exports': 2,
+        'imports': 2,
+    }
+    assert {name: m.stats[name] for name in expected} == expected
+    assert m.stats['compress_time'] > 0
+    assert type(h) is Sha256bit
+
+    # the region counts the work done inside it, whenever the hashers were created
+    before = Sha256bit(msg[:10])
+    with perf.Measure() as m:
+        before.update(msg[:128])
+        inside = Sha256bit(msg[:128])
+    assert m.stats['blocks'] == 2 + 2
+    stats = perf.stats()
+    before.update(msg)
+    inside.update(msg)
+    assert perf.stats() == stats
+    perf.enable()
+    try:
+        inside.update_many([msg[:50], msg[50:]])
+        assert perf.stats()['bytes'] == stats['bytes'] + len(msg)
+    finally:
+        perf.disable()
+    assert not perf.is_enabled()
+
+    # update_many counts its last fragment as an update, every fragment if the hasher is not byte aligned
+    fragments = [msg[:100], b'', msg[100:130], msg[130:140]]
+    names = ('blocks', 'updates', 'bits', 'bytes', 'cache_copies', 'cache_copy_bytes', 'shifted_bytes')
+    for prefix, bitlen, updates, shifted_bytes in [(msg[:3], 24, 1, 0), (b'\x80', 3, 3, 140)]:
+        h = Sha256bit(prefix, bitlen=bitlen)
+        with perf.Measure() as m:
+            h.update_many(fragments)
+        h = Sha256bit(prefix, bitlen=bitlen)
+        with perf.Measure() as separate:
+            for x in fragments:
+                if x:
+                    h.update(x)
+        counts = {name: m.stats[name] for name in names}
+        assert counts['updates'] == updates and counts['shifted_bytes'] == shifted_bytes
+        assert counts['bits'] == 140 * 8 and counts['bytes'] == 140 and counts['blocks'] == 2
+        if updates > 1:
+            assert counts == {name: separate.stats[name] for name in names}
+
+    # all threads are aggregated
+    perf.reset_stats()
+    assert not any(perf.stats().values())
+
+    def work():
+        Sha256bit(msg[:128]).digest()
+
+    with perf.Measure() as m:
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert m.stats['blocks'] == 4 * 3
+    assert perf.stats()['digests'] == 4
+
+
+def check_cli():
+    print('check command line tool')
+
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    from sha256bit import cli
+
+    def run(*args, stdin=b''):
+        p = subprocess.run(  # noqa: S603
+            [sys.executable, '-m', 'sha256bit.cli', *args], input=stdin, capture_output=True, check=False
+        )
+        return p.returncode, p.stdout.decode(), p.stderr.decode()
+
+    msg = msg_generator(b'cli', 3000 * 8)
+    with tempfile.TemporaryDirectory() as tmp:
+        names = ['a', 'empty', 'back\\slash', 'big']
+        contents = [msg[:1000], b'', msg[:65], msg * 50]
+        paths = [os.path.join(tmp, name) for name in names]
+        for path, content in zip(paths, contents):
+            with open(path, 'wb') as f:
+                f.write(content)
+        expected = [cli.format_line(hashlib.sha256(x).digest(), p) for p, x in zip(paths, contents)]
+        for jobs in ['1', '3']:
+            assert run('-j', jobs, *paths) == (0, '\n'.join(expected) + '\n', '')
+        assert expected[2].startswith('\\')
+
+        # bit lengths, per input or for all inputs
+        status, out, _ = run('-l', '7995', '-l', '0', paths[0], paths[1])
+        digest = Sha256bit(msg[:1000], bitlen=7995).digest()
+        assert status == 0
+        empty_line = cli.format_line(hashlib.sha256(b'').digest(), paths[1], 0)
+        assert out.splitlines() == [cli.format_line(digest, paths[0], 7995), empty_line]
+        assert (
+            run('-l', '13', stdin=msg[:2])[1] == cli.format_line(Sha256bit(msg[:2], bitlen=13).digest(), '-', 13) + '\n'
+        )
+        assert run('--hex', 'AB cd 1')[1] == cli.format_line(hashlib.sha256(b'\xab\xcd\x01').digest(), 'AB cd 1') + '\n'
+        status, out, err = run(paths[0], os.path.join(tmp, 'missing'))
+        assert status == 1 and out == expected[0] + '\n' and 'missing' in err
+
+        # check mode, sha256sum compatible
+        sums = os.path.join(tmp, 'sums')
+        with open(sums, 'w') as f:
+            f.write('\n'.join([*expected[:2], cli.format_line(digest, paths[0], 7995)]) + '\n')
+            f.write('%s *%s\n' % (hashlib.sha256(contents[3]).hexdigest(), paths[3]))
+            f.write('SHA256 (%s) = %s\n' % (paths[0], hashlib.sha256(contents[0]).hexdigest()))
+        for jobs in ['1', '2']:
+            status, out, err = run('--check', '-j', jobs, sums)
+            assert status == 0 and err == '' and out.count(': OK\n') == 5
+        assert run('--check', '--quiet', sums) == (0, '', '')
+        with open(paths[1], 'wb') as f:
+            f.write(b'x')
+        os.remove(paths[3])
+        with open(sums, 'a') as f:
+            f.write('garbage\n')
+        status, out, err = run('--check', '--quiet', sums)
+        assert status == 1
+        assert out == '%s: FAILED\n%s: FAILED open or read\n' % (paths[1], paths[3])
+        assert '1 line is improperly formatted' in err and '1 computed checksum did NOT match' in err
+        assert run('--check', '--status', sums) == (1, '', '')
+
+    assert cli.parse_line('\\%s  a\\nb\\\\' % ('00' * 32)) == (bytes(32), None, 'a\nb\\')
+    assert cli.parse_line('%s:5 *x' % ('00' * 32)) == (bytes(32), 5, 'x')
+    assert cli.parse_line('%s x' % ('00' * 32)) is None
+
+    # fast startup: no logging and no pysatl unless tracing
+    code = (
+        'import sys; from sha256bit import cli; cli.main(["-x", "00"]); '
+        'print(sorted({"logging", "pysatl"} & set(sys.modules)))'
+    )
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, check=True).stdout.decode()  # noqa: S603
+    assert out.splitlines()[-1] == '[]'
+    status, out, err = run('--log-level', 'INFO', '-x', '61 62 63')
+    assert status == 0 and 'digest: BA 78 16 BF' in err
+
+
+def check_checkpoint():
+    print('check resumable hashing')
+
+    import json
+    import os
+    import tempfile
+
+    from sha256bit import checkpoint
+
+    class CrashError(Exception):
+        pass
+
+    class Crashing(checkpoint.ResumableFileHash):
+        # simulates a preemption right after the n-th checkpoint
+        def __init__(self, path, crash_after, **kwargs):
+            super().__init__(path, **kwargs)
+            self.crash_after = crash_after
+
+        def _write_checkpoint(self, f, h, offset):
+            super()._write_checkpoint(f, h, offset)
+            if self.checkpoints == self.crash_after:
+                raise CrashError()
+
+    def crash(path, n, **kwargs):
+        try:
+            Crashing(path, n, **kwargs).run()
+        except CrashError:
+            return
+        raise AssertionError('no crash')
+
+    msg = msg_generator(b'checkpoint', 1000 * 8)
+    content = msg * 300
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'image')
+        with open(path, 'wb') as f:
+            f.write(content)
+        sidecar = path + checkpoint.SUFFIX
+        kwargs = {'interval_bytes': 50000, 'buffer_size': 16 * 1024, 'samples': 4}
+
+        h = checkpoint.hash_file_resumable(path, **kwargs)
+        assert h.digest() == hashlib.sha256(content).digest()
+        assert not os.path.exists(sidecar)
+
+        crash(path, 3, **kwargs)
+        assert os.path.exists(sidecar)
+        assert not [x for x in os.listdir(tmp) if '.tmp' in x]
+        r = checkpoint.ResumableFileHash(path, **kwargs)
+        assert r.run().digest() == hashlib.sha256(content).digest()
+        assert r.resumed_offset == 3 * 16 * 4 * 1024 and r.discarded is None
+        assert not os.path.exists(sidecar)
+
+        # partial last byte, checkpoint every buffer
+        bitlen = len(content) * 8 - 5
+        crash(path, 2, bitlen=bitlen, interval_seconds=0, buffer_size=1000)
+        r = checkpoint.ResumableFileHash(path, bitlen=bitlen, buffer_size=1000)
+        assert r.run().digest() == Sha256bit(content, bitlen=bitlen).digest()
+        assert r.resumed_offset == 2 * 960  # buffer size rounded to a multiple of 64
+
+        # a different bitlen or a modified prefix invalidate the checkpoint
+        crash(path, 2, **kwargs)
+        r = checkpoint.ResumableFileHash(path, bitlen=8000, **kwargs)
+        assert r.run().digest() == hashlib.sha256(content[:1000]).digest()
+        assert r.resumed_offset == 0 and r.discarded.startswith('bitlen changed')
+        crash(path, 2, **kwargs)
+        st = os.stat(path)
+        with open(path, 'r+b') as f:
+            f.write(b'X')
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        r = checkpoint.ResumableFileHash(path, **kwargs)
+        assert r.run().digest() == hashlib.sha256(b'X' + content[1:]).digest()
+        assert r.resumed_offset == 0 and r.discarded == 'the hashed part of the file changed'
+        crash(path, 1, **kwargs)
+        with open(path, 'ab') as f:
+            f.write(b'Y')
+        r = checkpoint.ResumableFileHash(path, **kwargs)
+        assert r.run().digest() == hashlib.sha256(b'X' + content[1:] + b'Y').digest()
+        assert r.resumed_offset == 0 and r.discarded.startswith('size changed')
+        with open(sidecar, 'w') as f:
+            f.write('{')
+        r = checkpoint.ResumableFileHash(path, **kwargs)
+        r.run()
+        assert r.discarded.startswith('unreadable checkpoint')
+
+        # truncated state
+        content = content[:-1]
+        with open(path, 'wb') as f:
+            f.write(content)
+        crash(path, 2, **kwargs)
+        with open(sidecar) as f:
+            data = json.load(f)
+        data['state'] = data['state'][:40]
+        with open(sidecar, 'w') as f:
+            json.dump(data, f)
+        r = checkpoint.ResumableFileHash(path, **kwargs)
+        assert r.run().digest() == hashlib.sha256(content).digest()
+        assert r.resumed_offset == 0 and r.discarded == "invalid checkpoint: AssertionError('truncated state')"
+
+
+def check_pool():
+    print('check reset and hasher pool')
+
+    import threading
+
+    from sha256bit import backend
+    from sha256bit.pool import HasherPool
+
+    msg = msg_generator(b'pool', 300 * 8)
+    assert not hasattr(Sha256bit(), '__dict__')
+    for name in backend.available_backends():
+        h = Sha256bit(msg[:3], bitlen=20, backend=name)
+        h.update(msg)
+        expected = h.digest()
+        fork = h.copy()
+        h.reset()
+        assert h.digest() == hashlib.sha256(b'').digest()
+        h.update(msg[:200])
+        assert h.digest() == hashlib.sha256(msg[:200]).digest()
+        assert fork.digest() == expected
+    h = Sha256bit.import_state({'h': hashlib.sha256(msg).digest(), 'cnt': len(msg) * 8, 'cache': None})
+    assert h.digest() == hashlib.sha256(msg).digest()
+    h.reset()
+    h.update(msg[:10])
+    assert h.digest() == hashlib.sha256(msg[:10]).digest()
+
+    pool = HasherPool(max_size=2)
+    h1 = pool.acquire(msg[:10])
+    h2 = pool.acquire()
+    h3 = pool.acquire()
+    assert h1.digest() == hashlib.sha256(msg[:10]).digest()
+    for h in [h1, h2, h3]:
+        pool.release(h)
+    assert len(pool) == 2
+    h = pool.acquire(msg[:7], bitlen=53)
+    assert h is h2 and h.digest() == Sha256bit(msg[:7], bitlen=53).digest()
+    with pool.hasher(msg) as h:
+        assert h is h1 and h.hexdigest() == hashlib.sha256(msg).hexdigest()
+    assert len(pool) == 1
+
+    errors = []
+
+    def work(seed):
+        for i in range(50):
+            data = msg[seed : seed + i]
+            if pool.digest(data) != hashlib.sha256(data).digest():
+                errors.append((seed, i))
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(pool) <= 2
+
+
+def check_update_many():
+    print('check update_many')
+
+    from sha256bit import backend
+
+    msg = msg_generator(b'many', 700 * 8)
+    rng = random.Random(23)
+    for name in backend.available_backends():
+        for _ in range(200):
+            cuts = sorted(rng.randrange(len(msg)) for _ in range(rng.randrange(8)))
+            fragments = [msg[a:b] for a, b in zip([0, *cuts], [*cuts, len(msg)])]
+            prefix_bitlen = rng.choice([0, 5, 8, 517])
+            prefix = msg[: (prefix_bitlen + 7) // 8]
+            bitlen = rng.choice([None, len(msg) * 8 - rng.randrange(1, 8)])
+            h = Sha256bit(prefix, bitlen=prefix_bitlen, backend=name)
+            h.update_many((bytearray(x) for x in fragments), bitlen=bitlen)
+            expected = Sha256bit(prefix, bitlen=prefix_bitlen)
+            expected.update(msg, bitlen=bitlen)
+            assert h.digest() == expected.digest()
+    h = Sha256bit(msg[:5])
+    h.update_many([b'', memoryview(msg[:100]).cast('I'), b'', msg[100:200], b''], bitlen=1596)
+    assert h.digest() == Sha256bit(msg[:5] + msg[:200], bitlen=1636).digest()
+    h.update_many([])
+    h.update_many([b''], bitlen=0)
+    assert h.digest() == Sha256bit(msg[:5] + msg[:200], bitlen=1636).digest()
+
+    # inconsistent bitlen: nothing is absorbed
+    h = Sha256bit(msg[:70])
+    state = h.export_state_bytes()
+    for bitlen in [0, 8, 800, 1609]:
+        try:
+            h.update_many([msg[:100], msg[100:200]], bitlen=bitlen)
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError('bitlen=%d accepted' % bitlen)
+        assert h.export_state_bytes() == state
+    assert h.digest() == hashlib.sha256(msg[:70]).digest()
 
 
 def check_api():
@@ -238,6 +1370,30 @@ def check_api():
 
 if __name__ == '__main__':
     check_api()
+    check_engines()
+    check_backends()
+    check_buffers()
+    check_tracer()
+    check_hash_many()
+    check_parallel()
+    check_files()
+    check_midstate_cache()
+    check_copy()
+    check_state_bytes()
+    check_search()
+    check_bit_stream()
+    check_digest_at()
+    check_merkle()
+    check_fixed_length()
+    check_hmac()
+    check_aio()
+    check_perf()
+    check_cli()
+    check_checkpoint()
+    check_pool()
+    check_update_many()
+    check_round_trace()
+    check_verify()
     check_hardcoded_test_vectors()
     check_against_nist_cavp()
     check_against_hashlib(n_seeds=3, max_length=1024 * 4)